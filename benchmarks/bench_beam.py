@@ -0,0 +1,122 @@
+"""Compare the accuracy and latency of the stack search, the chart search and the
+beam search"""
+import argparse
+import logging
+import math
+import random
+import time
+from datetime import datetime
+
+import yaml
+
+from timenlp import timenlp, warmup
+from timenlp.timenlp import set_parse_cache_size
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--corpus",
+        help="Corpus of phrases with their expected resolution",
+        default="datasets/corpus_resolution.yml",
+    )
+    parser.add_argument(
+        "--widths", help="Beam widths", type=int, nargs="+", default=[1, 3, 10, 30]
+    )
+    parser.add_argument(
+        "--margins",
+        help="Beam score margins",
+        type=float,
+        nargs="+",
+        default=[math.inf, 10.0, 3.0],
+    )
+    parser.add_argument(
+        "--long",
+        help="Number of long texts, each joining several phrases of the corpus",
+        type=int,
+        default=50,
+    )
+    parser.add_argument(
+        "--timeout", help="Timeout per text in seconds", type=float, default=1.0
+    )
+    parser.add_argument("--seed", help="Random seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def _run(texts, timeout, **kwargs):
+    # return the resolutions and the parsing time of each text
+    results = []
+    latencies = []
+    for txt, ts in texts:
+        t0 = time.perf_counter()
+        try:
+            parse = timenlp(txt, ts, timeout=timeout, **kwargs)
+        except Exception:  # noqa: B902 - some rules fail on some inputs
+            parse = None
+        latencies.append(time.perf_counter() - t0)
+        results.append(parse.resolution.nb_str() if parse else None)
+    return results, latencies
+
+
+def _latency_summary(latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    return "mean {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms".format(
+        1000 * sum(latencies) / len(latencies), 1000 * p99, 1000 * latencies[-1]
+    )
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
+    )
+    logging.getLogger("timenlp").setLevel(logging.ERROR)
+    warmup()
+    # every configuration has to run the search
+    set_parse_cache_size(0)
+
+    with open(args.corpus) as fd:
+        cases = yaml.safe_load(fd)
+    texts = []
+    expected = []
+    for case in cases:
+        ts = datetime.strptime(case["ref"], "%Y-%m-%dT%H:%M")
+        for phrase in case["phrases"]:
+            texts.append((phrase, ts))
+            expected.append(case["parsed"])
+    rnd = random.Random(args.seed)
+    long_texts = [
+        (" and ".join(rnd.choice(texts)[0] for _ in range(rnd.randint(2, 4))), ts)
+        for _ in range(args.long)
+    ]
+
+    configs = [("stack", {}), ("chart", dict(engine="chart"))]
+    for width in args.widths:
+        for margin in args.margins:
+            configs.append(
+                (
+                    "beam width {}, margin {}".format(width, margin),
+                    dict(engine="beam", beam_width=width, beam_margin=margin),
+                )
+            )
+    for name, kwargs in configs:
+        results, latencies = _run(texts, args.timeout, **kwargs)
+        correct = sum(r == e for r, e in zip(results, expected))
+        _, long_latencies = _run(long_texts, args.timeout, **kwargs)
+        logger.info(
+            "{}: {}/{} correct ({:.1%}); corpus {}; long texts {}".format(
+                name,
+                correct,
+                len(texts),
+                correct / len(texts),
+                _latency_summary(latencies),
+                _latency_summary(long_latencies),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
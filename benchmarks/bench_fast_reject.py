@@ -0,0 +1,127 @@
+"""Benchmark timenlp on a workload where most texts contain no time expression"""
+import argparse
+import logging
+import random
+import sys
+import time
+from datetime import datetime
+
+from timenlp import timenlp
+from timenlp.time import corpus
+from timenlp.scorer import model_score_cache_clear
+from timenlp.timenlp import _stage_cache, set_parse_cache_size
+
+# the package exports the function timenlp under the name of the module
+timenlp_module = sys.modules["timenlp.timenlp"]
+
+logger = logging.getLogger(__name__)
+
+NEGATIVES = [
+    "lol",
+    "ok cool",
+    "thanks, sounds good to me!",
+    "Could you send the report over when you get a chance?",
+    "I think that's a great idea",
+    "where is the office?",
+    "please call me back",
+    "can you review my pull request",
+    "what do you think about the new design",
+    "let me check with the team",
+    "I'm not sure I understand the question",
+    "the build is broken again",
+    "who is in charge of the budget",
+    "send me the link please",
+    "good luck with the presentation",
+    "happy to help",
+    "why is the test failing",
+    "ping me if you need anything",
+    "How are you doing?",
+    "we should talk about the roadmap",
+    "the coffee machine is broken",
+    "Did you see the game",
+    "it works on my machine",
+    "what a mess",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--size", help="Number of texts in the workload", type=int, default=2000
+    )
+    parser.add_argument(
+        "--positive-share",
+        help="Share of texts that contain a time expression",
+        type=float,
+        default=0.05,
+    )
+    parser.add_argument("--seed", help="Random seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def _without_pre_check(txt, ts):
+    # what timenlp did before the pre-check: run the full search on every text
+    may_have_parse = timenlp_module._may_have_parse
+    timenlp_module._may_have_parse = lambda txt: True
+    try:
+        return timenlp(txt, ts)
+    finally:
+        timenlp_module._may_have_parse = may_have_parse
+
+
+def _run(name, fun, texts, ts):
+    # start both runs with the same, empty model score cache
+    model_score_cache_clear()
+    t0 = time.perf_counter()
+    n_parsed = sum(fun(txt, ts) is not None for txt in texts)
+    elapsed = time.perf_counter() - t0
+    logger.info(
+        "{}: {:.3f}s total, {:.1f}us per text, {} parsed".format(
+            name, elapsed, 1e6 * elapsed / len(texts), n_parsed
+        )
+    )
+    return elapsed
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
+    )
+    # the warning for texts without a parse would dominate the timings
+    logging.getLogger("timenlp").setLevel(logging.ERROR)
+    # the workload repeats texts: without the parse cache and the cache of
+    # the regex matches, every text is parsed again in both runs
+    set_parse_cache_size(0)
+    _stage_cache.resize(0)
+
+    rnd = random.Random(args.seed)
+    ts = datetime(2020, 1, 1, 12)
+    positives = []
+    for _, _, corpus_texts in corpus.corpus:
+        for txt in corpus_texts:
+            try:
+                timenlp(txt, ts)
+            except Exception:  # noqa: B902 - some rules fail on some inputs
+                continue
+            positives.append(txt)
+    n_pos = int(args.size * args.positive_share)
+    texts = [rnd.choice(positives) for _ in range(n_pos)] + [
+        rnd.choice(NEGATIVES) for _ in range(args.size - n_pos)
+    ]
+    rnd.shuffle(texts)
+
+    logger.info("{} texts, {} with a time expression".format(len(texts), n_pos))
+    groups = [
+        ("texts without time", [txt for txt in texts if txt in NEGATIVES]),
+        ("texts with time", [txt for txt in texts if txt not in NEGATIVES]),
+        ("all texts", texts),
+    ]
+    for name, workload in groups:
+        t_base = _run(name + ", without pre-check", _without_pre_check, workload, ts)
+        t_new = _run(name + ", timenlp", lambda txt, ts: timenlp(txt, ts), workload, ts)
+        logger.info("speedup: {:.1f}x".format(t_base / t_new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark building the initial regex stacks for a growing number of matches"""
+import argparse
+import logging
+import random
+import time
+from typing import List, Tuple
+
+import regex
+
+from timenlp.rule import compiled_regexes
+from timenlp.time import corpus
+from timenlp.timenlp import _match_regex, _preprocess_string, _regex_stack
+from timenlp.types import RegexMatch
+
+logger = logging.getLogger(__name__)
+
+# joins the time expressions of a message without creating new matches
+FILLER = "lorem ipsum"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        help="Number of time expressions per message",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16, 64, 128],
+    )
+    parser.add_argument(
+        "--repeat", help="Number of repetitions per message", type=int, default=3
+    )
+    parser.add_argument("--seed", help="Random seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def _dense_regex_stack(
+    txt: str, regex_matches: List[RegexMatch]
+) -> List[Tuple[RegexMatch, ...]]:
+    # what _regex_stack did before: a dense adjacency matrix filled by running
+    # a regex on the gap between each pair of matches
+    prods = []
+    n_rm = len(regex_matches)
+    M = [[0 for _ in range(n_rm)] for _ in range(n_rm)]
+    separator_regex = regex.compile(r"\s*", regex.VERSION1)
+
+    def get_m_dist(m1: RegexMatch, m2: RegexMatch) -> int:
+        if m2.mstart < m1.mend:
+            return 0
+        return 1 if separator_regex.fullmatch(txt[m1.mend : m2.mstart]) else 0
+
+    for i in range(n_rm):
+        for j in range(i + 1, n_rm):
+            M[j][i] = get_m_dist(regex_matches[i], regex_matches[j])
+
+    stack = [(i,) for i in reversed(range(n_rm)) if sum(M[i]) == 0]
+    while stack:
+        s = stack.pop()
+        i = s[-1]
+        new_prod = False
+        for j in range(i + 1, n_rm):
+            if M[j][i] == 1:
+                stack.append(s + (j,))
+                new_prod = True
+        if not new_prod:
+            prods.append(tuple(regex_matches[i] for i in s))
+    return prods
+
+
+def _run(fun, txt, matches, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fun(txt, matches)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
+    )
+    logging.getLogger("timenlp").setLevel(logging.ERROR)
+
+    rnd = random.Random(args.seed)
+    phrases = [txt for _, _, corpus_texts in corpus.corpus for txt in corpus_texts]
+    for size in args.sizes:
+        txt = _preprocess_string(
+            " {} ".format(FILLER).join(rnd.choice(phrases) for _ in range(size))
+        )
+        matches = _match_regex(txt, compiled_regexes())
+        t_dense, expected = _run(_dense_regex_stack, txt, matches, args.repeat)
+        t_sweep, result = _run(_regex_stack, txt, matches, args.repeat)
+        assert result == expected
+        logger.info(
+            "{} expressions, {} matches, {} stacks: dense {:.1f}ms, "
+            "sweep {:.1f}ms, speedup {:.1f}x".format(
+                size,
+                len(matches),
+                len(result),
+                1000 * t_dense,
+                1000 * t_sweep,
+                t_dense / t_sweep,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
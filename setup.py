@@ -32,6 +32,9 @@ setup(
         'regex>=2018.6.6',
         'tqdm>=4.23.4,<5.0.0'
     ],
+    extras_require={
+        'numpy': ['numpy>=1.13'],
+    },
     license="MIT license",
     include_package_data=True,
     keywords='timenlp time parsing natural language',
@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from timenlp.cache import IdentityKey, LRUCache
+
+
+class Unhashable:
+    __hash__ = None  # type: ignore
+
+    def __eq__(self, other):
+        return True
+
+
+class LRUCacheTest(TestCase):
+    def test_get_put(self):
+        cache: LRUCache[int] = LRUCache(maxsize=2)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.info(), (1, 1, 2, 1))
+
+    def test_eviction(self):
+        cache: LRUCache[int] = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")  # b is now the least recently used entry
+        cache.put("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertIn("c", cache)
+
+    def test_disabled(self):
+        cache: LRUCache[int] = LRUCache(maxsize=0)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_clear(self):
+        cache: LRUCache[int] = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.get("a")
+        cache.clear()
+        self.assertEqual(cache.info(), (0, 0, 2, 0))
+
+    def test_negative_size(self):
+        with self.assertRaises(ValueError):
+            LRUCache(maxsize=-1)
+        with self.assertRaises(ValueError):
+            LRUCache().resize(-1)
+
+    def test_identity_key(self):
+        a, b = Unhashable(), Unhashable()
+        cache: LRUCache[int] = LRUCache()
+        cache.put(("x", IdentityKey(a)), 1)
+        self.assertEqual(cache.get(("x", IdentityKey(a))), 1)
+        self.assertIsNone(cache.get(("x", IdentityKey(b))))
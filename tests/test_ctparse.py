@@ -1,6 +1,42 @@
 from datetime import datetime
-from timenlp.timenlp import timenlp, timenlp_gen, _match_rule
-from timenlp.types import Interval, Time, Artifact
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import subprocess
+import sys
+
+import pytest
+import regex
+
+from timenlp.timenlp import (
+    parse_cache_clear,
+    parse_cache_info,
+    set_parse_cache_size,
+    TimeNLP,
+    timenlp,
+    timenlp_batch,
+    timenlp_gen,
+    timenlp_topk,
+    _match_masks,
+    _match_rule,
+    _may_have_parse,
+    _init_batch_worker,
+    _initial_stack,
+    _match_regex,
+    _preprocess_string,
+    _regex_stack,
+    _RegexLattice,
+    _timenlp,
+    _timenlp_beam,
+    _timenlp_chart,
+    _timenlp_chunk,
+    _stage_cache,
+    _is_permutation,
+)
+from timenlp.loader import load_default_scorer
+from timenlp.partial_parse import PartialParse
+from timenlp.rule import compiled_regexes, rules
+from timenlp.scorer import DummyScorer
+from timenlp.types import Interval, RegexMatch, Time, Artifact
 
 
 def test_ctparse():
@@ -39,6 +75,218 @@ def test_match_rule():
     assert list(_match_rule([Artifact()], [])) == []
 
 
+def test_match_masks():
+    seq: List[Any] = [1, 2, 4, 3, 1, 2]
+    for masks in [(1,), (2,), (1, 2), (1, 2, 4), (3, 3), (1, 2, 4, 1, 1, 2), (8,), ()]:
+        rule = [lambda s, m=m: bool(s & m) for m in masks]
+        assert list(_match_masks(seq, masks)) == list(_match_rule(seq, rule))
+    assert list(_match_masks([], (1,))) == []
+
+
+def test_regex_stack():
+    txt = "tomorrow I go between 2 pm and 5  pm"
+    spans = [(0, 8), (22, 23), (22, 26), (24, 26), (31, 32), (34, 36)]
+    matches = []
+    for i, (start, end) in enumerate(spans):
+        pattern = "(?<R{}>{})".format(i, regex.escape(txt[start:end]))
+        matches.append(RegexMatch(i, regex.compile(pattern).match(txt, start)))
+
+    stacks = [[m.id for m in s] for s in _regex_stack(txt, matches)]
+    # overlapping matches are not consecutive, whitespace of any length is
+    assert stacks == [[0], [1, 3], [2], [4, 5]]
+    assert _regex_stack(txt, []) == []
+
+
+def test_regex_lattice():
+    txt = _preprocess_string("may 5 at 8 or 9 may 5")
+    matches = _match_regex(txt, compiled_regexes())
+    lattice = _RegexLattice(txt, matches)
+    stacks = list(lattice.stacks())
+    assert [tuple(matches[i] for i in s) for s in stacks] == _regex_stack(
+        txt, matches
+    )
+
+    def covered(s: Sequence[int]) -> int:
+        return matches[s[-1]].mend - matches[s[0]].mstart
+
+    longest = max(covered(s) for s in stacks)
+    for min_covered_chars in [0, 3, longest - 1, longest, longest + 1]:
+        assert list(lattice.stacks(min_covered_chars)) == [
+            s for s in stacks if covered(s) >= min_covered_chars
+        ]
+    longest_first = list(lattice.longest_stacks())
+    assert sorted(longest_first, key=_RegexLattice.order_key) == stacks
+    assert [covered(s) for s in longest_first] == sorted(
+        (covered(s) for s in stacks), reverse=True
+    )
+    for max_stack_depth in [0, 1, 2, 10]:
+        bound = lattice.min_covered_chars(0.5, max_stack_depth)
+        assert bound >= longest * 0.5
+        kept = sorted(covered(s) for s in stacks)[-max_stack_depth:]
+        assert all(c >= bound for c in kept)
+
+
+def test_max_initial_stack(caplog):
+    # the number of sequences doubles with every token
+    txt = _preprocess_string("1 2 " * 3)
+    stack = _initial_stack(txt, lambda: None, 0.0, 0, 10)
+    assert len(stack) == 10
+    assert "initial stack limited" in caplog.text
+    full_stack = _initial_stack(txt, lambda: None, 0.0, 0, 0)
+    assert len(full_stack) > 1000
+
+    # the longest sequences are kept, in the order of the full stack, even if
+    # shorter ones come first
+    txt = _preprocess_string("1 2 1 2 gargel 1 2 1 2 1 2")
+    stack = _initial_stack(txt, lambda: None, 0.0, 0, 10)
+    full_stack = _initial_stack(txt, lambda: None, 0.0, 0, 0)
+
+    def covered(pp):
+        return pp.prod[-1].mend - pp.prod[0].mstart
+
+    assert sorted(map(covered, stack)) == sorted(map(covered, full_stack))[-10:]
+    prods = [pp.prod for pp in full_stack]
+    assert [pp.prod for pp in stack] == sorted(
+        (pp.prod for pp in stack), key=prods.index
+    )
+    ts = datetime(2020, 1, 1)
+    assert timenlp(txt, ts, timeout=0, max_initial_stack=10)
+
+
+def _resolutions(search: Iterable[Optional[TimeNLP]]) -> List[Artifact]:
+    return [p.resolution for p in search if p]
+
+
+def test_chart_engine(monkeypatch):
+    ts = datetime(2020, 1, 1, 7, 0)
+    scorer = DummyScorer()
+    for txt in ["May 5th 2020 at 8pm", "tomorrow 8:00 - 9:00 pm", "1 2 1 2"]:
+        txt = _preprocess_string(txt)
+        chart = _resolutions(_timenlp_chart(txt, ts, 0, 1.0, scorer))
+        stack = _resolutions(_timenlp(txt, ts, 0, 1.0, 0, scorer))
+        # the chart produces every parse, the stack engine a subset of them
+        assert stack
+        assert all(r in chart for r in stack)
+
+    # the artifacts of the chart are shared, rules are applied to copies as
+    # they may change their arguments, e.g. extend the span of the time
+    # returned by ruleAbsorbOnTime
+    chart_artifacts = []
+
+    class RecordingScorer(DummyScorer):
+        def score_final(self, txt, ts, partial_parse, prod):
+            chart_artifacts.append(prod)
+            return 0.0
+
+    absorb, patterns = rules["ruleAbsorbOnTime"]
+    calls = []
+
+    def checked_absorb(ts, *args):
+        calls.append(args)
+        assert not any(a is p for a in args for p in chart_artifacts)
+        return absorb(ts, *args)
+
+    monkeypatch.setitem(rules, "ruleAbsorbOnTime", (checked_absorb, patterns))
+    for _ in _timenlp_chart("on May 5th at 8:00", ts, 0, 1.0, RecordingScorer()):
+        pass
+    assert calls
+    monkeypatch.undo()
+
+    parse = timenlp("May 5th 2020 at 8pm", ts, engine="chart")
+    assert parse
+    assert parse.resolution == Time(2020, 5, 5, 20, 0)
+    with pytest.raises(ValueError):
+        timenlp("May 5th 2020 at 8pm", ts, engine="unknown")
+
+
+def test_timenlp_topk():
+    ts = datetime(2020, 1, 1, 7, 0)
+    txt = "May 5th 2020 at 8pm"
+    parses = [p for p in timenlp_gen(txt, ts, latent_time=False) if p]
+    top = timenlp_topk(txt, 3, ts, latent_time=False)
+    assert len(top) == 3 < len(parses)
+    assert [p.score for p in top] == sorted((p.score for p in parses), reverse=True)[:3]
+    assert str(top[0]) == str(timenlp(txt, ts, latent_time=False))
+    assert len(timenlp_topk(txt, 100, ts)) == len(parses)
+    assert timenlp_topk("gargelbabel", 3, ts) == []
+    # ties are broken in favour of the parse generated last, like in timenlp
+    scorer = DummyScorer()
+    parses = [p for p in timenlp_gen(txt, ts, scorer=scorer) if p]
+    top = timenlp_topk(txt, 2, ts, scorer=scorer)
+    assert [str(p) for p in top] == [str(parses[-1]), str(parses[-2])]
+    with pytest.raises(ValueError):
+        timenlp_topk(txt, 0, ts)
+
+
+def test_best_only():
+    ts = datetime(2018, 3, 1)
+    scorer = load_default_scorer()
+    for txt in [
+        "monday 5th march 2018 from 2 to 4pm",
+        "May 5th 2020 at 8pm",
+        "tomorrow 8 yesterday Sep 9 9 12 2023 1923",
+    ]:
+        txt = _preprocess_string(txt)
+        full = [p for p in _timenlp(txt, ts, 0, 1.0, 10, scorer) if p]
+        best = [p for p in _timenlp(txt, ts, 0, 1.0, 10, scorer, best_only=True) if p]
+        # only parses at least as good as all before are emitted
+        assert len(best) < len(full)
+        assert all(p.score <= q.score for p, q in zip(best, best[1:]))
+        assert str(best[-1]) == str(max(reversed(full), key=lambda p: p.score))
+        assert str(timenlp(txt, ts, timeout=0, best_only=True)) == str(
+            timenlp(txt, ts, timeout=0)
+        )
+
+
+def test_beam_engine(monkeypatch):
+    # the package exports the function timenlp under the name of the module
+    timenlp_module = sys.modules[_timenlp_beam.__module__]
+    ts = datetime(2018, 3, 1)
+    parse = timenlp("monday 5th march 2018 from 2 to 4pm", ts, engine="beam")
+    assert parse
+    assert parse.resolution == Interval(
+        Time(2018, 3, 5, 14, 0), Time(2018, 3, 5, 16, 0)
+    )
+
+    # no more than beam_width partial parses are expanded per level
+    apply_rules = timenlp_module._apply_rules
+    levels: Dict[int, int] = {}
+
+    def counting_apply_rules(ts, pp):
+        level = sum(1 for r in pp.rules if isinstance(r, str))
+        levels[level] = levels.get(level, 0) + 1
+        return apply_rules(ts, pp)
+
+    monkeypatch.setattr(timenlp_module, "_apply_rules", counting_apply_rules)
+    txt = _preprocess_string("May 5th 2020 at 8pm")
+    scorer = load_default_scorer()
+    for width in [1, 3]:
+        levels.clear()
+        assert [p for p in _timenlp_beam(txt, ts, 0, 1.0, scorer, width, math.inf)]
+        assert max(levels.values()) == width
+    # a margin of 0 keeps only the best scored partial parses
+    levels.clear()
+    assert [p for p in _timenlp_beam(txt, ts, 0, 1.0, scorer, 0, 0.0)]
+    assert max(levels.values()) == 1
+
+
+def test_merge_permutations():
+    prod = (Time(2020, 5, 5), Time(hour=20, minute=0))
+    stack_rules: Dict[Any, Any] = {}
+    assert not _is_permutation(stack_rules, PartialParse(prod, (1, 2, "a", "b")))
+    assert _is_permutation(stack_rules, PartialParse(prod, (1, 2, "b", "a")))
+    assert not _is_permutation(stack_rules, PartialParse(prod, (1, 2, "a", "c")))
+    assert _is_permutation(stack_rules, PartialParse(prod, (1, 2, "c", "a")))
+
+    ts = datetime(2018, 3, 1)
+    txt = "monday 5th march 2018 from 2 to 4pm"
+    parse = timenlp(txt, ts, max_stack_depth=0, merge_permutations=True)
+    assert parse
+    assert parse.resolution == Interval(
+        Time(2018, 3, 5, 14, 0), Time(2018, 3, 5, 16, 0)
+    )
+
+
 def test_latent_time():
     parse = timenlp("8:00 pm", ts=datetime(2020, 1, 1, 7, 0), latent_time=False)
     assert parse
@@ -65,3 +313,192 @@ def test_latent_time_interval():
     assert parse.resolution == Interval(
         Time(2020, 1, 1, 20, 00), Time(2020, 1, 1, 21, 00)
     )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_timenlp_batch(workers):
+    ts = datetime(2020, 1, 1, 7, 0)
+    texts = ["12.12.2020", "gargelbabel", "8:00 pm", "today", "tomorrow at 9"]
+    expected = [timenlp(txt, ts=ts) for txt in texts]
+
+    result = timenlp_batch(texts, ts=ts, workers=workers, chunksize=2)
+    # more chunks than are submitted at once
+    result_gen = timenlp_batch(
+        (txt for txt in texts * 3), ts=ts, workers=workers, chunksize=1
+    )
+
+    assert len(result) == len(texts)
+    assert len(result_gen) == 3 * len(texts)
+    for res, exp in zip(result + result_gen, expected * 4):
+        if exp is None:
+            assert res is None
+        else:
+            assert res
+            assert res.resolution == exp.resolution
+            assert res.production == exp.production
+
+
+def test_timenlp_batch_worker_scorer():
+    # the scorer is set once per worker and used for all chunks
+    ts = datetime(2020, 1, 1, 7, 0)
+    _init_batch_worker(DummyScorer())
+    try:
+        parses = _timenlp_chunk(["today", "8:00 pm"], ts)
+    finally:
+        _init_batch_worker(None)
+    assert all(p is not None and p.score == 0.0 for p in parses)
+    assert all(
+        p is not None and p.score != 0.0
+        for p in _timenlp_chunk(["today", "8:00 pm"], ts)
+    )
+
+
+def test_timenlp_batch_chunksize():
+    with pytest.raises(ValueError):
+        timenlp_batch(["today"], chunksize=0)
+
+
+@pytest.mark.parametrize(
+    "txt,expected",
+    [
+        ("gargelbabel", False),
+        ("thanks, sounds good to me!", False),
+        ("what a mess", False),
+        ("see you tomorrow", True),
+        ("in 2 days", True),
+        ("someone", True),
+    ],
+)
+def test_may_have_parse(txt, expected):
+    txt = _preprocess_string(txt)
+    assert _may_have_parse(txt) == expected
+    if not expected:
+        # the full search does not find anything either
+        parses = _timenlp(
+            txt,
+            datetime(2020, 12, 1),
+            timeout=0,
+            relative_match_len=0.0,
+            max_stack_depth=0,
+            scorer=DummyScorer(),
+        )
+        assert not any(parses)
+
+
+@pytest.fixture
+def parse_cache():
+    parse_cache_clear()
+    yield
+    set_parse_cache_size(1024)
+    parse_cache_clear()
+
+
+def test_parse_cache(parse_cache):
+    ts = datetime(2020, 12, 1)
+    res = timenlp("tomorrow at 9", ts=ts)
+    assert res is not None
+    assert parse_cache_info().misses == 1
+    assert parse_cache_info().currsize == 1
+
+    # same text up to case and white space
+    cached = timenlp("Tomorrow  AT 9", ts=ts)
+    assert cached is not None
+    assert parse_cache_info().hits == 1
+    assert cached is not res
+    assert repr(cached) == repr(res)
+    assert (cached.resolution.mstart, cached.resolution.mend) == (
+        res.resolution.mstart,
+        res.resolution.mend,
+    )
+    assert [repr(p) for p in timenlp_gen("tomorrow at 9", ts=ts)] == [
+        repr(p) for p in timenlp_gen("tomorrow at 9", ts=ts, timeout=0)
+    ]
+    assert parse_cache_info().hits == 3
+
+    # other reference time or parameters
+    timenlp("tomorrow at 9", ts=datetime(2020, 12, 2))
+    timenlp("tomorrow at 9", ts=ts, latent_time=False)
+    timenlp("tomorrow at 9", ts=ts, scorer=DummyScorer())
+    # the best-only search does not produce all parses
+    timenlp("tomorrow at 9", ts=ts, best_only=True)
+    assert parse_cache_info().hits == 3
+    assert parse_cache_info().currsize == 5
+
+
+def test_parse_cache_results_are_copies(parse_cache):
+    ts = datetime(2020, 12, 1)
+    res = timenlp("tomorrow", ts=ts)
+    assert res is not None and isinstance(res.resolution, Time)
+    res.resolution.day = 1
+    res = timenlp("tomorrow", ts=ts)
+    assert res is not None and isinstance(res.resolution, Time)
+    assert res.resolution.day == 2
+
+
+def test_parse_cache_timeout(parse_cache):
+    timenlp("tomorrow 8 yesterday Sep 9 9 12 2023 1923", timeout=0.0001)
+    assert parse_cache_info().currsize == 0
+
+
+def test_parse_cache_size(parse_cache):
+    set_parse_cache_size(1)
+    ts = datetime(2020, 12, 1)
+    timenlp("tomorrow", ts=ts)
+    timenlp("yesterday", ts=ts)
+    assert parse_cache_info().currsize == 1
+    set_parse_cache_size(0)
+    assert parse_cache_info().currsize == 0
+    timenlp("tomorrow", ts=ts)
+    assert parse_cache_info().currsize == 0
+
+
+def test_stage_cache(parse_cache):
+    txt = "tomorrow at 9"
+    timenlp(txt, ts=datetime(2020, 12, 1))
+    assert _stage_cache.info().misses == 1
+    # another reference time only reruns the search
+    res = timenlp(txt, ts=datetime(2020, 12, 2))
+    assert res is not None
+    assert _stage_cache.info().hits == 1
+    assert res.resolution == Time(year=2020, month=12, day=3, hour=9, minute=0)
+
+    set_parse_cache_size(0)
+    parse_cache_clear()
+    uncached = timenlp(txt, ts=datetime(2020, 12, 2))
+    assert repr(uncached) == repr(res)
+
+
+def test_lazy_initialization():
+    # a fresh interpreter is needed, the package is loaded already
+    code = (
+        "import timenlp, importlib\n"
+        "m = importlib.import_module('timenlp.timenlp')\n"
+        "from timenlp.rule import _regex, _regex_pending\n"
+        "assert m._DEFAULT_SCORER is None\n"
+        "assert not _regex and _regex_pending\n"
+        "timenlp.warmup()\n"
+        "assert m._DEFAULT_SCORER is not None\n"
+        "assert _regex and not _regex_pending\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_batched_scoring():
+    class BatchScorer(DummyScorer):
+        def __init__(self) -> None:
+            self.batches: List[int] = []
+
+        def score_batch(self, txt, ts, partial_parses):
+            self.batches.append(len(partial_parses))
+            return [float(len(pp.rules)) for pp in partial_parses]
+
+        def score_final_batch(self, txt, ts, partial_parse, prods):
+            self.batches.append(len(prods))
+            return [float(len(partial_parse.rules))] * len(prods)
+
+    scorer = BatchScorer()
+    ts = datetime(2019, 1, 1)
+    parses = list(timenlp_gen("May 5th 2:30 in the afternoon", ts, scorer=scorer))
+    assert parses
+    # all children of a stack element are scored with one call
+    assert any(n > 1 for n in scorer.batches)
@@ -0,0 +1,93 @@
+import random
+from typing import List, Tuple
+
+import pytest
+
+from timenlp import nb_numpy
+from timenlp.count_vectorizer import CountVectorizer
+from timenlp.nb_estimator import MultinomialNaiveBayes
+from timenlp.nb_scorer import train_naive_bayes
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def pure_python(monkeypatch):
+    # force the pure python implementation
+    monkeypatch.setattr(nb_numpy, "numpy_or_none", lambda: None)
+
+
+def _dataset(n_docs: int = 200, seed: int = 0) -> Tuple[List[List[str]], List[bool]]:
+    rng = random.Random(seed)
+    tokens = ["r{}".format(i) for i in range(15)]
+    X = [
+        [rng.choice(tokens) for _ in range(rng.randint(1, 8))] for _ in range(n_docs)
+    ]
+    y = [rng.random() < 0.3 for _ in range(n_docs)]
+    return X, y
+
+
+def test_csr_from_dicts():
+    X = [{0: 1, 2: 3}, {}, {1: 2}]
+    csr = nb_numpy.csr_from_dicts(X, 4)
+    assert csr.shape == (3, 4)
+    assert csr.indptr.tolist() == [0, 2, 2, 3]
+    assert csr.indices.tolist() == [0, 2, 1]
+    assert csr.data.tolist() == [1.0, 3.0, 2.0]
+
+
+def test_transform_csr():
+    cv = CountVectorizer((1, 2)).fit([["a", "b", "c"], ["c", "d"]])
+    docs = [["b", "c", "b", "c"], ["x"], ["a", "b"]]
+    csr = cv.transform_csr(docs)
+    assert cv.vocabulary
+    assert csr.shape == (3, len(cv.vocabulary))
+    for i, doc_vector in enumerate(cv.transform(docs)):
+        row = slice(csr.indptr[i], csr.indptr[i + 1])
+        expected = {idx: cnt for idx, cnt in doc_vector.items() if cnt}
+        assert dict(zip(csr.indices[row].tolist(), csr.data[row].tolist())) == expected
+
+
+def test_transform_csr_no_fit():
+    with pytest.raises(ValueError):
+        CountVectorizer((1, 2)).transform_csr([["a"]])
+
+
+def test_fit_matches_pure_python(monkeypatch):
+    X, y = _dataset()
+    model = train_naive_bayes(X, y)
+    with monkeypatch.context() as m:
+        m.setattr(nb_numpy, "numpy_or_none", lambda: None)
+        model_python = train_naive_bayes(X, y)
+
+    assert model.estimator.class_prior == model_python.estimator.class_prior
+    for cls in ("negative_class", "positive_class"):
+        assert model.estimator.log_likelihood[cls] == pytest.approx(
+            model_python.estimator.log_likelihood[cls], abs=1e-12
+        )
+
+
+def test_predict_matches_pure_python(monkeypatch):
+    X, y = _dataset()
+    model = train_naive_bayes(X, y)
+    pred = model.predict_log_proba(X)
+    batch = model.predict_log_proba_batch(X)
+    with monkeypatch.context() as m:
+        m.setattr(nb_numpy, "numpy_or_none", lambda: None)
+        pred_python = model.predict_log_proba(X)
+
+    assert batch.shape == (len(X), 2)
+    assert np.allclose(batch, np.array(pred_python), atol=1e-12)
+    assert np.allclose(np.array(pred), np.array(pred_python), atol=1e-12)
+
+    # small batches, e.g. the single documents of the scorer, are predicted in
+    # pure python
+    for x, p in zip(X[:10], pred_python):
+        assert model.predict_log_proba([x]) == [p]
+
+
+def test_pure_python_fallback(pure_python):
+    nb = MultinomialNaiveBayes().fit([{0: 1, 1: 0}, {1: 2}], [1, -1])
+    assert len(nb.predict_log_probability([{0: 1}])) == 1
+    with pytest.raises(ImportError):
+        nb.predict_log_probability_csr(nb_numpy.CSRMatrix(None, None, None, (0, 0)))
@@ -4,7 +4,9 @@ from typing import Any, Callable
 import pytest
 import regex
 
-from timenlp.partial_parse import PartialParse, _seq_match
+from timenlp.partial_parse import PartialParse, _applicable_rules, _seq_match
+from timenlp.rule import compiled_regexes, rules
+from timenlp.timenlp import _match_regex, _preprocess_string, _regex_stack
 from timenlp.types import RegexMatch, Time
 
 
@@ -34,6 +36,24 @@ def test_partial_parse() -> None:
         PartialParse((), ())
 
 
+@pytest.mark.parametrize(
+    "txt",
+    [
+        "tomorrow at 5 pm",
+        "between 9 and 10 am on the 3rd of May",
+        "next monday 8:30-9:15",
+        "gargelbabel",
+    ],
+)
+def test_applicable_rules(txt: str) -> None:
+    txt = _preprocess_string(txt)
+    for prod in _regex_stack(txt, _match_regex(txt, compiled_regexes())):
+        expected = PartialParse(prod, ())._filter_rules(rules)
+        assert list(_applicable_rules(prod).items()) == list(expected.items())
+        # memoized by the regex ids
+        assert _applicable_rules(prod) is _applicable_rules(prod)
+
+
 def test_seq_match() -> None:
     # NOTE: we are testing a private function because the algorithm
     # is quite complex
@@ -0,0 +1,103 @@
+import pytest
+
+from timenlp.prefilter import (
+    KeywordIndex,
+    min_match_length,
+    normalize_text,
+    required_literals,
+)
+from timenlp.rule import compiled_regexes
+from timenlp.timenlp import _match_regex, _preprocess_string
+
+
+@pytest.mark.parametrize(
+    "pattern,anchors",
+    [
+        (r"midnight", [{"midnight"}]),
+        (r"yesterdays?", [{"yesterday"}]),
+        (r"ago|before", [{"ago", "before"}]),
+        (r"(?:the )?(?:(?:(?:end)|(?:last day)) of)", [{"end of", "last day of"}]),
+        (r"\b(?P<dom>\d\d?)\s+of", [{"of"}, set("0123456789")]),
+        (r"\d+", [set("0123456789")]),
+        (r"\d+\s+(?:days?|weeks?)", [{"week", "day"}, set("0123456789")]),
+        (r"(?P<x>\w+)", None),
+        (r"a|\w", None),
+        (r"x?", None),
+        (r"(?:x){e<=1}", None),
+        (r"\p{L}abc", None),
+        (r"früh", None),
+        (r"((", None),
+    ],
+)
+def test_required_literals(pattern, anchors):
+    result = required_literals(pattern)
+    if anchors is None:
+        assert result is None
+    else:
+        assert result == [frozenset(a) for a in anchors]
+
+
+@pytest.mark.parametrize(
+    "pattern,length",
+    [
+        (r"midnight", 8),
+        (r"yesterdays?", 9),
+        (r"\d+\s*h", 2),
+        (r"(?:the )?", 0),
+        (r"\b", 0),
+        (r"(?:x){e<=1}", None),
+        (r"((", None),
+    ],
+)
+def test_min_match_length(pattern, length):
+    assert min_match_length(pattern) == length
+
+
+def test_normalize_text():
+    assert normalize_text("Tomorrow AT 9") == "tomorrow at 9"
+    assert normalize_text("STRAẞE") == "strasse"
+    assert normalize_text("İn") == "in"
+
+
+def test_keyword_index():
+    index = KeywordIndex()
+    index.add(1, [frozenset(["tomorrow"])])
+    index.add(2, [frozenset(["ago", "before"])])
+    index.add(3, None)
+    index.add(4, [frozenset(["day", "week"]), frozenset("0123456789")])
+
+    assert 1 in index
+    assert 5 not in index
+    assert index.candidates("see you TOMORROW") == {1, 3}
+    assert index.candidates("two days before") == {2, 3}
+    assert index.candidates("2 days before") == {2, 3, 4}
+    assert index.candidates("nothing") == {3}
+
+
+def test_keyword_index_other_digits():
+    index = KeywordIndex()
+    index.add(1, [frozenset("0123456789")])
+    assert index.candidates("at 9") == {1}
+    assert index.candidates("at ٩") == {1}
+    assert index.candidates("at nine") == set()
+
+
+@pytest.mark.parametrize(
+    "txt",
+    [
+        "tomorrow at 9",
+        "monday 5th march 2018 from 2 to 4pm",
+        "nothing to see here",
+        "İN 2 DAYS",
+        "between ٣ and 5",
+    ],
+)
+def test_match_regex_prefilter(txt):
+    txt = _preprocess_string(txt)
+    expected = sorted(
+        (r_id, m.span())
+        for r_id, re in compiled_regexes().items()
+        for m in re.finditer(txt, overlapped=True)
+    )
+    matches = _match_regex(txt, compiled_regexes())
+    assert sorted((m.id, (m.mstart, m.mend)) for m in matches) == expected
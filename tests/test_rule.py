@@ -1,7 +1,25 @@
+from typing import Any, Tuple
 from unittest import TestCase
 import regex
-from timenlp.types import RegexMatch, Artifact
-from timenlp.rule import dimension, predicate, regex_match, rule
+from timenlp import rule as rule_module
+from timenlp.types import RegexMatch, Artifact, Time
+from timenlp.rule import (
+    _bits_by_key,
+    _expand_defines,
+    _predicate_bits,
+    _predicate_regex,
+    _regex_bits,
+    _rule_masks,
+    _seed_rules,
+    _signature_tests,
+    dimension,
+    latent_rules_chain,
+    predicate,
+    regex_match,
+    rule,
+    rules,
+    signature,
+)
 
 
 class TestClassA(Artifact):
@@ -12,7 +30,34 @@ class TestClassB(Artifact):
     pass
 
 
+# registries of timenlp.rule that the tests extend
+_registries: Tuple[Any, ...] = (
+    rules,
+    _rule_masks,
+    _seed_rules,
+    _predicate_regex,
+    _predicate_bits,
+    _bits_by_key,
+    _regex_bits,
+    _signature_tests,
+)
+
+
 class TestRule(TestCase):
+    def setUp(self):
+        self._saved = [r.copy() for r in _registries]
+
+    def tearDown(self):
+        # predicates and rules are registered globally, do not let the ones
+        # created here change the signatures seen by other tests
+        for registry, saved in zip(_registries, self._saved):
+            if isinstance(registry, list):
+                registry[:] = saved
+            else:
+                registry.clear()
+                registry.update(saved)
+        rule_module._rules_version += 1
+
     def test_empty_regex_match_not_allowed(self):
         with self.assertRaises(ValueError):
             rule(r"")
@@ -42,3 +87,61 @@ class TestRule(TestCase):
     def test_predicate(self):
         self.assertTrue(predicate("predA")(TestClassA()))
         self.assertFalse(predicate("predA")(TestClassB()))
+
+    def test_expand_defines(self):
+        expanded = _expand_defines(r"(?P<day>(?&_day))\.(?&_month)(?&unknown)")
+        self.assertNotIn("(?&_day)", expanded)
+        self.assertNotIn("(?&_month)", expanded)
+        self.assertIn("(?&unknown)", expanded)
+        self.assertTrue(regex.fullmatch(_expand_defines(r"(?&_day)\.(?&_month)"), "31.12"))
+
+    def test_seed_rules(self):
+        # rules consisting of regular expressions only
+        self.assertIn("ruleToday", _seed_rules)
+        self.assertIn("ruleDigitDuration", _seed_rules)
+        self.assertEqual(len(_seed_rules["ruleToday"]), 1)
+        # rules that need a production first
+        self.assertNotIn("ruleDOWDOM", _seed_rules)
+        self.assertNotIn("ruleDurationAgo", _seed_rules)
+
+    def test_predicate_regex(self):
+        self.assertEqual(_predicate_regex[regex_match(7)], 7)
+        self.assertIsNone(_predicate_regex[predicate("isDOW")])
+        self.assertIsNone(_predicate_regex[dimension(Time)])
+        # may accept a RegexMatch
+        self.assertNotIn(dimension(Artifact), _predicate_regex)
+        self.assertNotIn(predicate("mstart"), _predicate_regex)
+
+    def test_signature(self):
+        m = RegexMatch(7, regex.match(r"(?P<R7>x)", "x"))
+        t = Time(hour=8)
+        for p in [regex_match(7), regex_match(8), dimension(Time), predicate("isTOD")]:
+            bit = _predicate_bits[p]
+            self.assertEqual(bool(signature(m) & bit), bool(p(m)))
+            self.assertEqual(bool(signature(t) & bit), bool(p(t)))
+        # identical predicates share a bit
+        self.assertEqual(
+            _predicate_bits[predicate("isTOD")], _predicate_bits[predicate("isTOD")]
+        )
+        # new predicates invalidate stored signatures
+        p = predicate("hasTOD_test_signature")
+        setattr(Time, "hasTOD_test_signature", True)
+        try:
+            self.assertTrue(signature(t) & _predicate_bits[p])
+        finally:
+            delattr(Time, "hasTOD_test_signature")
+
+    def test_rule_masks(self):
+        for name, (_, patterns) in rules.items():
+            masks = _rule_masks[name]
+            self.assertEqual(masks, tuple(_predicate_bits[p] for p in patterns))
+
+    def test_latent_rules_chain(self):
+        self.assertFalse(latent_rules_chain())
+
+        # turns a date into a day of month, which ruleLatentDOM applies to
+        @rule(predicate("isDate"))
+        def ruleTestDateToDOM(ts, t):
+            return Time(day=t.day)
+
+        self.assertTrue(latent_rules_chain())
@@ -3,13 +3,49 @@ import random
 import bz2
 import pickle
 
-from timenlp.nb_scorer import NaiveBayesScorer, train_naive_bayes, save_naive_bayes
+import pytest
+
+from timenlp.loader import load_default_scorer
+from timenlp.nb_model import BinaryNaiveBayesModel, NGramWeights, is_binary_model
+from timenlp.nb_scorer import (
+    NaiveBayesScorer,
+    save_naive_bayes,
+    save_naive_bayes_binary,
+    train_naive_bayes,
+)
 from timenlp.partial_parse import PartialParse
-from timenlp.scorer import DummyScorer, RandomScorer
+from timenlp.scorer import (
+    DummyScorer,
+    RandomScorer,
+    Scorer,
+    memoized_model_score,
+    model_score_cache_clear,
+    model_score_cache_info,
+    set_model_score_cache_size,
+)
 from timenlp.count_vectorizer import CountVectorizer
 from timenlp.nb_estimator import MultinomialNaiveBayes
 from timenlp.pipeline import TimeNLPPipeline
-from timenlp.types import Interval, Time
+from timenlp.time.corpus import corpus
+from timenlp.timenlp import timenlp_gen
+from timenlp.types import Artifact, Interval, Time
+
+
+# rule sequences and labels of the model trained by the nb_model fixture
+_X = [("a", "b"), ("a",), ("b", "c"), ("a", "b", "a", "b"), ("c", "a", "b")]
+_y = [False, True, True, False, True]
+
+
+@pytest.fixture
+def nb_model():
+    return train_naive_bayes(_X, _y)
+
+
+@pytest.fixture
+def nb_model_file(tmp_path, nb_model):
+    path = tmp_path / "model.bin"
+    save_naive_bayes_binary(nb_model, path)
+    return path
 
 
 def test_dummy():
@@ -73,3 +109,282 @@ def test_save_naive_bayes(tmp_path):
     path = tmp_path / "model.pkl"
     model = TimeNLPPipeline(CountVectorizer((1, 1)), MultinomialNaiveBayes())
     save_naive_bayes(model, path)
+
+
+def test_naive_bayes_binary(nb_model, nb_model_file):
+    assert is_binary_model(nb_model_file)
+
+    binary_model = BinaryNaiveBayesModel(nb_model_file)
+    docs = _X + [(), ("d",), ("b", "a", "b", "c")]
+    for x, log_odds, pred in zip(
+        docs, binary_model.predict_log_odds(docs), nb_model.predict_log_proba(docs)
+    ):
+        assert log_odds == pytest.approx(pred[1] - pred[0], abs=1e-9)
+
+    nb = NaiveBayesScorer.from_model_file(nb_model_file)
+    assert isinstance(nb._model, BinaryNaiveBayesModel)
+
+    # the mapping is re-created when unpickled, e.g. in worker processes
+    binary_copy = pickle.loads(pickle.dumps(binary_model))
+    assert binary_copy.predict_log_odds(docs) == binary_model.predict_log_odds(docs)
+
+
+def test_ngram_weights(nb_model, nb_model_file):
+    binary_model = BinaryNaiveBayesModel(nb_model_file)
+    weights = NGramWeights.from_binary_model(binary_model)
+    pipeline_weights = NGramWeights.from_pipeline(nb_model)
+
+    rules = _X + [(), ("d",), ("b", "a", "d", "c"), (1, "a"), ("a", "b", "c", "a")]
+    for r in rules:
+        expected = binary_model.predict_log_odds([[str(t) for t in r]])[0]
+        assert weights.score(r) == expected
+        pred = nb_model.predict_log_proba([[str(t) for t in r]])[0]
+        assert pipeline_weights.score(r) == pred[1] - pred[0]
+
+    pp = PartialParse((Time(), Interval()), ("a", "b"))
+    pp.prod[0].mstart = 0
+    pp.prod[1].mend = 2
+    nb = NaiveBayesScorer(binary_model)
+    assert nb.score("ab", datetime.datetime(2019, 1, 1), pp) == weights.score(
+        ("a", "b")
+    )
+
+
+def test_naive_bayes_binary_corrupt(tmp_path):
+    model = train_naive_bayes([("a", "b"), ("a",)], [True, False])
+    path = tmp_path / "model.bin"
+    save_naive_bayes_binary(model, path)
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        BinaryNaiveBayesModel(path)
+
+    save_naive_bayes(model, path)
+    assert not is_binary_model(path)
+    with pytest.raises(ValueError):
+        BinaryNaiveBayesModel(path)
+
+
+def test_load_default_scorer():
+    scorer = load_default_scorer()
+    assert isinstance(scorer, NaiveBayesScorer)
+    assert isinstance(scorer._model, TimeNLPPipeline)
+
+
+def test_ngram_weights_corpus():
+    # the default model scores the rules of the corpus like the pipeline
+    scorer = load_default_scorer()
+    assert isinstance(scorer, NaiveBayesScorer)
+    pipeline = scorer._model
+    assert isinstance(pipeline, TimeNLPPipeline)
+    weights = NGramWeights.from_pipeline(pipeline)
+    sequences = set()
+
+    class RecordingScorer(Scorer):
+        def score(self, txt, ts, partial_parse):
+            sequences.add(partial_parse.rules)
+            return 0.0
+
+        def score_final(self, txt, ts, partial_parse, prod):
+            return 0.0
+
+    for _, ts_str, tests in corpus[:100]:
+        ts = datetime.datetime.strptime(ts_str, "%Y-%m-%dT%H:%M")
+        for txt in tests:
+            try:
+                for _ in timenlp_gen(txt, ts, timeout=0, scorer=RecordingScorer()):
+                    pass
+            except TypeError:
+                # ruleTODTOD fails for some texts, the rules up to there count
+                pass
+    assert len(sequences) > 1000
+
+    for rules in sequences:
+        pred = pipeline.predict_log_proba([[str(r) for r in rules]])[0]
+        assert weights.score(rules) == pred[1] - pred[0]
+
+
+def test_ngram_weights_incremental(nb_model, nb_model_file):
+    weights = NGramWeights.from_binary_model(BinaryNaiveBayesModel(nb_model_file))
+    ts = datetime.datetime(2019, 1, 1)
+
+    pp = PartialParse((Time(), Time()), ("a",))
+    assert weights.score_partial_parse(pp) == weights.score(("a",))
+    for rule_name in ["b", "a", "d", "b", "c"]:
+        child = pp.apply_rule(ts, lambda ts, *args: Time(), rule_name, (0, 1))
+        assert child is not None and child.log_odds is not None
+        assert child.log_odds[1] == len(child.rules) - 1
+        assert weights.score_partial_parse(child) == weights.score(child.rules)
+        assert child.log_odds[1] == len(child.rules)
+        pp = child
+
+    # state of another model is ignored
+    other = NGramWeights.from_pipeline(train_naive_bayes(_X, [not y_i for y_i in _y]))
+    assert other.score_partial_parse(pp) == other.score(pp.rules)
+
+    # the scores of the pipeline are not incremental, they are recomputed
+    pipeline_weights = NGramWeights.from_pipeline(nb_model)
+    assert pipeline_weights.score_partial_parse(pp) == pipeline_weights.score(pp.rules)
+    child = pp.apply_rule(ts, lambda ts, *args: Time(), "a", (0, 1))
+    assert child is not None
+    assert pipeline_weights.score_partial_parse(child) == pipeline_weights.score(
+        child.rules
+    )
+
+
+class CountingScorer(Scorer):
+    rules_only = True
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def model_score(self, partial_parse: PartialParse) -> float:
+        self.calls += 1
+        return float(len(partial_parse.rules))
+
+    def score(
+        self, txt: str, ts: datetime.datetime, partial_parse: PartialParse
+    ) -> float:
+        return memoized_model_score(self, partial_parse)
+
+    def score_final(
+        self,
+        txt: str,
+        ts: datetime.datetime,
+        partial_parse: PartialParse,
+        prod: Artifact,
+    ) -> float:
+        return memoized_model_score(self, partial_parse) + 1.0
+
+
+def test_memoized_model_score():
+    model_score_cache_clear()
+    ts = datetime.datetime(2019, 1, 1)
+    scorer = CountingScorer()
+    pp = PartialParse((Time(), Interval()), ("rule1", "rule2"))
+    pp2 = PartialParse((Time(),), ("rule1", "rule2"))
+
+    assert scorer.score("a", ts, pp) == 2.0
+    assert scorer.score("b", ts, pp2) == 2.0
+    assert scorer.score_final("a", ts, pp, pp.prod[0]) == 3.0
+    assert scorer.calls == 1
+    assert model_score_cache_info().hits == 2
+    assert model_score_cache_info().misses == 1
+
+    # the cache is per scorer
+    other = CountingScorer()
+    assert other.score("a", ts, pp) == 2.0
+    assert other.calls == 1
+
+    # scorers must declare that they only depend on the rules
+    other.rules_only = False
+    other.score("a", ts, pp)
+    assert other.calls == 2
+
+    set_model_score_cache_size(0)
+    try:
+        scorer.score("a", ts, PartialParse((Time(),), ("rule3",)))
+        scorer.score("a", ts, PartialParse((Time(),), ("rule3",)))
+        assert scorer.calls == 3
+    finally:
+        set_model_score_cache_size(32768)
+        model_score_cache_clear()
+
+
+def test_model_score_required():
+    with pytest.raises(TypeError):
+
+        class NoModelScorer(DummyScorer):
+            rules_only = True
+
+    with pytest.raises(NotImplementedError):
+        DummyScorer().model_score(PartialParse((Time(),), ("rule1",)))
+
+
+def test_memoized_model_score_incremental(nb_model):
+    scorer = NaiveBayesScorer(nb_model)
+    weights = scorer._get_ngram_weights()
+    ts = datetime.datetime(2019, 1, 1)
+
+    def partial_parse() -> PartialParse:
+        pp = PartialParse((Time(), Time()), ("a", "b"))
+        pp.prod[1].mend = 2
+        return pp
+
+    model_score_cache_clear()
+    scorer.score("ab", ts, partial_parse())
+    # a cache hit still passes the score on to the derived partial parses
+    pp = partial_parse()
+    scorer.score("ab", ts, pp)
+    assert model_score_cache_info().hits == 1
+    assert pp.log_odds == (weights, 2, weights.score(("a", "b")))
+    child = pp.apply_rule(ts, lambda ts, *args: Time(), "c", (0, 1))
+    assert child is not None and child.log_odds is not None
+    assert child.log_odds[1] == 2
+    assert weights.score_partial_parse(child) == weights.score(("a", "b", "c"))
+    model_score_cache_clear()
+
+
+def test_batch_defaults():
+    ts = datetime.datetime(2019, 1, 1)
+    pps = [
+        PartialParse((Time(), Interval()), ("rule1", "rule2")),
+        PartialParse((Time(),), ("rule1",)),
+    ]
+    scorer = CountingScorer()
+    model_score_cache_clear()
+    assert scorer.score_batch("a", ts, pps) == [2.0, 1.0]
+    assert scorer.score_final_batch("a", ts, pps[0], pps[0].prod) == [3.0, 3.0]
+    assert DummyScorer().score_batch("a", ts, pps) == [0.0, 0.0]
+    assert DummyScorer().score_final_batch("a", ts, pps[0], pps[0].prod) == [0.0] * 2
+    model_score_cache_clear()
+
+
+def test_nbscorer_batch(nb_model):
+    scorer = NaiveBayesScorer(nb_model)
+    ts = datetime.datetime(2019, 1, 1)
+    pps = []
+    for rules in _X:
+        pp = PartialParse((Time(), Time()), rules)
+        pp.prod[0].mstart, pp.prod[0].mend = 0, 2
+        pp.prod[1].mstart, pp.prod[1].mend = 3, 4
+        pps.append(pp)
+
+    assert scorer.score_batch("abcdef", ts, pps) == [
+        scorer.score("abcdef", ts, pp) for pp in pps
+    ]
+    assert scorer.score_final_batch("abcdef", ts, pps[0], pps[0].prod) == [
+        scorer.score_final("abcdef", ts, pps[0], prod) for prod in pps[0].prod
+    ]
+
+
+def test_max_rule_gain(nb_model):
+    weights = NGramWeights.from_pipeline(nb_model)
+    gain = weights.max_rule_gain()
+    assert gain >= 0.0
+    tokens = ["a", "b", "c", "d"]
+    for rules in [(), ("a",), ("b", "a"), ("c", "a", "b"), ("d", "d")]:
+        for t in tokens:
+            assert weights.score(rules + (t,)) <= weights.score(rules) + gain + 1e-9
+
+
+def test_final_score_bound(monkeypatch, nb_model):
+    ts = datetime.datetime(2019, 1, 1)
+    pp = PartialParse((Time(), Interval()), ("rule1", "rule2"))
+    assert CountingScorer().final_score_bound("a", ts, pp) == float("inf")
+
+    scorer = NaiveBayesScorer(nb_model)
+    t1, t2, interval = Time(), Time(), Interval()
+    t1.mstart, t1.mend = 0, 2
+    t2.mstart, t2.mend = 3, 4
+    interval.mstart, interval.mend = 0, 4
+    pp = PartialParse((t1, t2), ("c",))
+    bound = scorer.final_score_bound("abcdef", ts, pp)
+    assert bound >= scorer.score_final("abcdef", ts, pp, t1)
+    # up to 4 more rules can be applied to two artifacts
+    for rules in [("a",), ("a", "b"), ("a", "b", "a", "b")]:
+        derived = PartialParse((interval,), pp.rules + rules)
+        assert bound >= scorer.score_final("abcdef", ts, derived, interval)
+
+    # no bound if the latent rules can be applied to each other's results
+    monkeypatch.setattr("timenlp.nb_scorer.latent_rules_chain", lambda: True)
+    assert scorer.final_score_bound("abcdef", ts, pp) == float("inf")
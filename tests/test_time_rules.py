@@ -1,7 +1,12 @@
+from datetime import datetime
 from unittest import TestCase
 
-from timenlp.types import Time
+import regex
+
+from timenlp.rule import _str_regex
+from timenlp.types import RegexMatch, Time
 from timenlp.time.rules import (
+    ruleNextOrLastYearOrMonth,
     ruleDateDate,
     ruleDOMDate,
     ruleDateTimeDateTime,
@@ -91,3 +96,12 @@ class TestRules(TestCase):
     def test_ruleQuarterAferHH(self):
         t1 = Time(hour=12, minute=1)
         self.assertIsNone(ruleQuarterAfterHH(None, None, t1))
+
+    def test_ruleNextOrLastYearOrMonth(self):
+        pattern = r"(?P<next_or_last>next|last) (?:(?P<year>years?)|(?P<month>months?))"
+        r_id = _str_regex[pattern]
+        ts = datetime(2020, 6, 15)
+        compiled = regex.compile(r"(?i)(?P<R{}>{})".format(r_id, pattern))
+        for txt, year in [("next year", 2021), ("Next Year", 2021), ("LAST YEAR", 2019)]:
+            m = RegexMatch(r_id, compiled.match(txt))
+            self.assertEqual(ruleNextOrLastYearOrMonth(ts, m), Time(year=year))
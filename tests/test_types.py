@@ -1,3 +1,5 @@
+import copy
+import pickle
 from unittest import TestCase
 import regex
 from datetime import datetime
@@ -29,6 +31,44 @@ class TestArtifact(TestCase):
         b = Interval()
         self.assertNotEqual(a, b)
 
+    def test_hash(self):
+        a = Time(2017, 12, 12, POD="morning")
+        b = Time(2017, 12, 12, POD="morning")
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(hash(Interval(a, a)), hash(Interval(b, b)))
+        # setting an attribute discards the cached hash
+        hash(a)
+        a.day = 13
+        self.assertEqual(hash(a), hash(Time(2017, 12, 13, POD="morning")))
+        self.assertNotEqual(a, b)
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            Time().foo = 1
+
+    def test_subclass_attrs(self):
+        class Tagged(Time):
+            __slots__ = ("label",)
+            _attrs = Time._attrs + ("label",)
+
+            def __init__(self, label: str) -> None:
+                super().__init__(2017, 12, 12)
+                self.label = label
+
+        # equality and the hash use the _attrs of the subclass
+        self.assertEqual(Tagged("a"), Tagged("a"))
+        self.assertNotEqual(Tagged("a"), Tagged("b"))
+        self.assertEqual(hash(Tagged("a")), hash(Tagged("a")))
+
+    def test_copy(self):
+        a = Interval(Time(2017, 12, 12, POD="morning"), Time(hour=8))
+        a.update_span(Artifact(), Artifact())
+        hash(a)
+        for b in [pickle.loads(pickle.dumps(a)), copy.deepcopy(a), copy.copy(a)]:
+            self.assertEqual(a, b)
+            self.assertEqual(hash(a), hash(b))
+            self.assertEqual(repr(a), repr(b))
+
     def test_update_span(self):
         a1 = Artifact()
         a2 = Artifact()
@@ -65,6 +105,18 @@ class TestTime(TestCase):
     def test_init(self):
         self.assertIsNotNone(Time())
 
+    def test_mask(self):
+        t = Time(hour=0)
+        self.assertTrue(t.isHour)
+        t.minute = 0
+        self.assertFalse(t.isHour)
+        self.assertTrue(t.isTOD)
+        t.hour = None
+        self.assertFalse(t.hasTime)
+        t = pickle.loads(pickle.dumps(Time(2017, 12, 12)))
+        self.assertTrue(t.isDate)
+        self.assertTrue(t.hasDOY)
+
     def test_isDOY(self):
         self.assertTrue(Time(month=1, day=1).isDOY)
         self.assertFalse(Time(year=1).isDOY)
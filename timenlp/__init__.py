@@ -7,4 +7,13 @@ __author__ = """Sebastian Mika"""
 __email__ = "sebastian.mika@comtravo.com"
 __version__ = "__version__ = '0.3.1'"
 
-from .timenlp import timenlp, timenlp_gen  # noqa
+from .timenlp import (  # noqa
+    parse_cache_clear,
+    parse_cache_info,
+    set_parse_cache_size,
+    timenlp,
+    timenlp_batch,
+    timenlp_gen,
+    timenlp_topk,
+    warmup,
+)
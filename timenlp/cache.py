@@ -0,0 +1,99 @@
+"""A bounded least-recently-used cache.
+
+Although this module is not part of the public API, it is used in various parts of
+the timenlp package.
+
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Generic, Hashable, NamedTuple, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class IdentityKey:
+    __slots__ = ("obj",)
+
+    def __init__(self, obj: Any) -> None:
+        """Part of a cache key that compares equal only to keys of the very same
+        object, e.g. for objects that are not hashable. The object is kept
+        alive as long as the key exists."""
+        self.obj = obj
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, IdentityKey) and other.obj is self.obj
+
+    def __hash__(self) -> int:
+        return id(self.obj)
+
+
+class LRUCache(Generic[V]):
+    def __init__(self, maxsize: int = 128) -> None:
+        """A mapping that holds at most *maxsize* entries and evicts the least
+        recently used entry first.
+
+        :param maxsize: maximal number of entries; 0 disables the cache
+        """
+        if maxsize < 0:
+            raise ValueError("maxsize must not be negative")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # type: OrderedDict[Hashable, V]
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Return the value stored for *key* or None, counting hits and misses"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: V) -> None:
+        """Store *value* for *key*, evicting the least recently used entries if
+        the cache is full"""
+        with self._lock:
+            if self.maxsize == 0:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def resize(self, maxsize: int) -> None:
+        """Change the maximal number of entries, evicting entries if needed"""
+        if maxsize < 0:
+            raise ValueError("maxsize must not be negative")
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the statistics"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
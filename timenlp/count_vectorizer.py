@@ -1,6 +1,8 @@
 from collections import defaultdict
 from typing import Dict, Sequence, Tuple, Optional
 
+from . import nb_numpy
+
 
 class CountVectorizer:
     def __init__(self, ngram_range: Tuple[int, int]):
@@ -111,6 +113,21 @@ class CountVectorizer:
                 all_features.add(feature)
         return {word: idx for idx, word in enumerate(sorted(all_features))}
 
+    @staticmethod
+    def _create_doc_vector(
+        vocabulary: Dict[str, int], count_dict: Dict[str, int]
+    ) -> Dict[int, int]:
+        """Map the counts of the string features of one document to a sparse map
+        of `{feature_index: count}`, in the order of *count_dict*. Features that
+        are not in the vocabulary are dropped.
+        """
+        doc_vector: Dict[int, int] = defaultdict(int)
+        for word, cnt in count_dict.items():
+            idx = vocabulary.get(word, None)
+            if idx is not None:
+                doc_vector[idx] = cnt
+        return doc_vector
+
     @staticmethod
     def _create_feature_matrix(
         vocabulary: Dict[str, int], count_matrix: Sequence[Dict[str, int]]
@@ -134,15 +151,11 @@ class CountVectorizer:
             feature appeared in the document.
         """
         len_vocab = len(vocabulary)
-        count_vectors_matrix = []
         # Build document frequency matrix
-        for count_dict in count_matrix:
-            doc_vector: Dict[int, int] = defaultdict(int)
-            for word, cnt in count_dict.items():
-                idx = vocabulary.get(word, None)
-                if idx is not None:
-                    doc_vector[idx] = cnt
-            count_vectors_matrix.append(doc_vector)
+        count_vectors_matrix = [
+            CountVectorizer._create_doc_vector(vocabulary, count_dict)
+            for count_dict in count_matrix
+        ]
         # add vocab length in first element
         count_vectors_matrix[0][len_vocab - 1] = count_vectors_matrix[0][len_vocab - 1]
         return count_vectors_matrix
@@ -201,3 +214,29 @@ class CountVectorizer:
             raise ValueError("no vocabulary - vectorizer not fitted?")
         count_matrix = CountVectorizer._get_feature_counts(self.ngram_range, documents)
         return CountVectorizer._create_feature_matrix(self.vocabulary, count_matrix)
+
+    def transform_csr(self, documents: Sequence[Sequence[str]]) -> nb_numpy.CSRMatrix:
+        """Create a sparse term-document matrix in CSR format based on the
+        pre-generated vocabulary. Requires NumPy.
+
+        Parameters
+        ----------
+        documents : Sequence[Sequence[str]]
+            Sequence of documents, each as a sequence of tokens
+
+        Returns
+        -------
+        CSRMatrix
+            Document-term matrix with one column per vocabulary entry.
+        """
+        if not self.vocabulary:
+            raise ValueError("no vocabulary - vectorizer not fitted?")
+        vocabulary = self.vocabulary
+        count_matrix = CountVectorizer._get_feature_counts(self.ngram_range, documents)
+        return nb_numpy.csr_from_dicts(
+            [
+                CountVectorizer._create_doc_vector(vocabulary, count_dict)
+                for count_dict in count_matrix
+            ],
+            len(vocabulary),
+        )
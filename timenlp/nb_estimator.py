@@ -1,6 +1,8 @@
-from typing import Sequence, Dict, Tuple, List
+from typing import Any, Sequence, Dict, Tuple, List
 from math import log, exp
 
+from . import nb_numpy
+
 
 def _log_sum_exp(x: Sequence[float]) -> float:
     max_value = max(x)
@@ -8,6 +10,11 @@ def _log_sum_exp(x: Sequence[float]) -> float:
     return max_value + log(sum_of_exp)
 
 
+# Smaller batches, e.g. the single documents of NaiveBayesScorer, are faster
+# to predict in pure python than to convert to a CSR matrix
+_NUMPY_MIN_BATCH = 64
+
+
 class MultinomialNaiveBayes:
     """Implements a multinomial naive Bayes classifier. For background information
     (and what has inspired this, see e.g. https://scikit-learn.org/stable/...
@@ -45,6 +52,15 @@ class MultinomialNaiveBayes:
         # implicit assumption from vectorizer: first element has count for #vocab
         # size set
         vocabulary_len = max(X[0].keys()) + 1
+        if nb_numpy.numpy_or_none() is not None:
+            log_likelihood_negative, log_likelihood_positive = nb_numpy.log_likelihood(
+                nb_numpy.csr_from_dicts(X, vocabulary_len), y, alpha
+            )
+            return {
+                "negative_class": log_likelihood_negative,
+                "positive_class": log_likelihood_positive,
+            }
+
         token_counts_negative = [alpha] * vocabulary_len
         token_counts_positive = [alpha] * vocabulary_len
         for x, y_ in zip(X, y):
@@ -108,6 +124,13 @@ class MultinomialNaiveBayes:
         Sequence[Tuple[float, float]]
             Tuple of (negative-class, positive-class) log likelihoods
         """
+        if len(X) >= _NUMPY_MIN_BATCH and nb_numpy.numpy_or_none() is not None:
+            n_features = len(self.log_likelihood["positive_class"])
+            pred = self.predict_log_probability_csr(
+                nb_numpy.csr_from_dicts(X, n_features)
+            )
+            return [(neg, pos) for neg, pos in pred.tolist()]
+
         scores = []
         for x in X:
             # Initialise the scores with priors of positive and negative class
@@ -121,3 +144,22 @@ class MultinomialNaiveBayes:
             log_prob_x = _log_sum_exp(joint_log_likelihood)
             scores.append((neg_score - log_prob_x, pos_score - log_prob_x))
         return scores
+
+    def predict_log_probability_csr(self, X: "nb_numpy.CSRMatrix") -> Any:
+        """Calculate the posterior log probability of many samples at once. Requires
+        NumPy.
+
+        Parameters
+        ----------
+        X : CSRMatrix
+            Document-term matrix, e.g. from `CountVectorizer.transform_csr`
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (number of samples, 2) with the negative-class and the
+            positive-class log likelihood of each sample
+        """
+        return nb_numpy.predict_log_probability(
+            X, self.class_prior, self.log_likelihood
+        )
@@ -0,0 +1,328 @@
+"""A compact binary format for the naive bayes model of `NaiveBayesScorer`.
+
+The file consists of a fixed size header, a contiguous array of little endian
+doubles holding one log-odds weight per feature and a table of the features
+(utf-8 encoded, separated by newlines) in the order of the weights. As the
+score of the scorer is the log-odds of the positive class, the two class
+log-likelihoods of the estimator collapse into one weight per feature.
+
+Files are memory mapped when loaded, so there is no decompression or
+unpickling. The feature table is decoded into a dictionary right away and
+`NGramWeights` copies the weights on first use, hence each process still holds
+its own copy of the model.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+from .nb_estimator import _log_sum_exp
+from .partial_parse import PartialParse
+from .pipeline import TimeNLPPipeline
+
+MAGIC = b"TNLPNB01"
+
+# magic, min_n, max_n, number of features, size of the feature table in bytes,
+# prior log-odds
+_HEADER = struct.Struct("<8sIIIId")
+
+PathType = Union[str, "os.PathLike[str]"]
+
+
+def is_binary_model(fname: PathType) -> bool:
+    """Return True if *fname* is a model in the binary format"""
+    with open(fname, "rb") as fd:
+        return fd.read(len(MAGIC)) == MAGIC
+
+
+def save_binary_model(model: TimeNLPPipeline, fname: PathType) -> None:
+    """Save the vocabulary and the log-odds weights of *model* in the binary
+    format.
+
+    :param model: a fitted pipeline as returned by `train_naive_bayes`
+    :param fname: name of the file to write
+    """
+    vocabulary = model.transformer.vocabulary
+    if not vocabulary:
+        raise ValueError("no vocabulary - model not fitted?")
+    features = sorted(vocabulary, key=vocabulary.__getitem__)
+    if any("\n" in f for f in features):
+        raise ValueError("features must not contain newlines")
+    log_likelihood = model.estimator.log_likelihood
+    weights = array(
+        "d",
+        (
+            log_likelihood["positive_class"][vocabulary[f]]
+            - log_likelihood["negative_class"][vocabulary[f]]
+            for f in features
+        ),
+    )
+    if sys.byteorder != "little":  # pragma: no cover
+        weights.byteswap()
+    table = "\n".join(features).encode("utf-8")
+    prior = model.estimator.class_prior[1] - model.estimator.class_prior[0]
+    min_n, max_n = model.transformer.ngram_range
+    with open(fname, "wb") as fd:
+        fd.write(_HEADER.pack(MAGIC, min_n, max_n, len(features), len(table), prior))
+        fd.write(weights.tobytes())
+        fd.write(table)
+
+
+class BinaryNaiveBayesModel:
+    def __init__(self, fname: PathType) -> None:
+        """A naive bayes model loaded from a file in the binary format.
+
+        :param fname: name of a file written by `save_binary_model`
+        """
+        self.fname = fname
+        with open(fname, "rb") as fd:
+            self._mmap = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, min_n, max_n, n_features, table_size, prior = _HEADER.unpack_from(
+                self._mmap
+            )
+            if magic != MAGIC:
+                raise ValueError("{} is not a binary timenlp model".format(fname))
+            start = _HEADER.size
+            end = start + 8 * n_features
+            if len(self._mmap) != end + table_size:
+                raise ValueError("{} is truncated or corrupt".format(fname))
+        except Exception:
+            self._mmap.close()
+            raise
+        self.ngram_range = (min_n, max_n)
+        self.prior = prior
+        if sys.byteorder == "little":
+            # a view into the mapped file, no copy
+            self.weights = memoryview(self._mmap)[start:end].cast(
+                "d"
+            )  # type: Sequence[float]
+        else:  # pragma: no cover
+            weights = array("d", self._mmap[start:end])
+            weights.byteswap()
+            self.weights = weights
+        features = self._mmap[end:].decode("utf-8").split("\n")
+        self.vocabulary = {
+            f: i for i, f in enumerate(features)
+        }  # type: Dict[str, int]
+
+    def predict_log_odds(self, X: Sequence[Sequence[str]]) -> Sequence[float]:
+        """Return the log-odds of the positive class for each document in *X*,
+        each a sequence of tokens"""
+        min_n, max_n = self.ngram_range
+        vocabulary = self.vocabulary
+        weights = self.weights
+        space_join = " ".join
+        scores = []
+        for document in X:
+            score = self.prior
+            # n-grams ordered by their last token, see NGramWeights
+            for end in range(len(document)):
+                for n in range(min_n, min(max_n, end + 1) + 1):
+                    idx = vocabulary.get(space_join(document[end - n + 1 : end + 1]))
+                    if idx is not None:
+                        score += weights[idx]
+            scores.append(score)
+        return scores
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # the mapping itself cannot be pickled, map the file again instead
+        return (self.__class__, (self.fname,))
+
+
+class NGramWeights:
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        weights: Sequence[float],
+        prior: float,
+        ngram_range: Tuple[int, int],
+        class_log_likelihood: Optional[Tuple[Sequence[float], Sequence[float]]] = None,
+        class_prior: Optional[Tuple[float, float]] = None,
+    ) -> None:
+        """Log-odds weights of the n-grams of a sequence of rules.
+
+        The n-gram strings of the vocabulary are replaced by integers: each
+        token gets an id and an n-gram is the number with these ids as digits,
+        so scoring a sequence of rules needs no string joins. Scores are
+        identical to `BinaryNaiveBayesModel.predict_log_odds` for the same
+        weights.
+
+        If the class log-likelihoods are given, the scores are computed like
+        `MultinomialNaiveBayes.predict_log_probability` instead, adding the
+        terms of each class in the same order, and are identical to those of
+        the pipeline. These scores are not incremental.
+
+        :param vocabulary: the n-gram features as {feature: index} pairs
+        :param weights: the log-odds weight of each feature index
+        :param prior: the prior log-odds
+        :param ngram_range: the n-gram range of the vocabulary
+        :param class_log_likelihood: the (negative, positive) class
+            log-likelihoods of each feature index
+        :param class_prior: the (negative, positive) class log-priors
+        """
+        self.prior = prior
+        self.ngram_range = ngram_range
+        tokens = {t for feature in vocabulary for t in feature.split(" ")}
+        # 0 is the id of unknown tokens, hence no n-gram containing an unknown
+        # token has a weight
+        self._token_ids = {
+            t: i for i, t in enumerate(sorted(tokens), 1)
+        }  # type: Dict[str, int]
+        self._base = len(self._token_ids) + 1
+        # weights of the n-grams by n - 1
+        self._weights = [
+            {} for _ in range(ngram_range[1])
+        ]  # type: List[Dict[int, float]]
+        # the (negative, positive) class log-likelihoods of the n-grams by n - 1
+        self._class_weights = (
+            None
+        )  # type: Optional[List[Dict[int, Tuple[float, float]]]]
+        if class_log_likelihood is not None:
+            self._class_weights = [{} for _ in range(ngram_range[1])]
+        self._class_prior = class_prior
+        for feature, idx in vocabulary.items():
+            code = 0
+            feature_tokens = feature.split(" ")
+            for t in feature_tokens:
+                code = code * self._base + self._token_ids[t]
+            self._weights[len(feature_tokens) - 1][code] = weights[idx]
+            if self._class_weights is not None and class_log_likelihood is not None:
+                self._class_weights[len(feature_tokens) - 1][code] = (
+                    class_log_likelihood[0][idx],
+                    class_log_likelihood[1][idx],
+                )
+        self._rule_ids = {}  # type: Dict[Hashable, int]
+        # computed on first use, see max_rule_gain
+        self._max_rule_gain = None  # type: Optional[float]
+
+    @classmethod
+    def from_pipeline(cls, model: TimeNLPPipeline) -> "NGramWeights":
+        vocabulary = model.transformer.vocabulary
+        if not vocabulary:
+            raise ValueError("no vocabulary - model not fitted?")
+        log_likelihood = model.estimator.log_likelihood
+        weights = [
+            p - n
+            for p, n in zip(
+                log_likelihood["positive_class"], log_likelihood["negative_class"]
+            )
+        ]
+        class_prior = model.estimator.class_prior
+        return cls(
+            vocabulary,
+            weights,
+            class_prior[1] - class_prior[0],
+            model.transformer.ngram_range,
+            (log_likelihood["negative_class"], log_likelihood["positive_class"]),
+            class_prior,
+        )
+
+    @classmethod
+    def from_binary_model(cls, model: BinaryNaiveBayesModel) -> "NGramWeights":
+        return cls(model.vocabulary, model.weights, model.prior, model.ngram_range)
+
+    def _rule_id(self, rule: Hashable) -> int:
+        rule_id = self._token_ids.get(str(rule), 0)
+        self._rule_ids[rule] = rule_id
+        return rule_id
+
+    def _ids(self, rules: Sequence[Hashable]) -> List[int]:
+        rule_ids = self._rule_ids
+        try:
+            return [rule_ids[r] for r in rules]
+        except KeyError:
+            return [rule_ids[r] if r in rule_ids else self._rule_id(r) for r in rules]
+
+    def _add_ngrams_ending_at(
+        self, score: float, ids: Sequence[int], end: int
+    ) -> float:
+        # add the weights of all n-grams that end with token ids[end]
+        min_n, max_n = self.ngram_range
+        base = self._base
+        code = 0
+        factor = 1
+        for n in range(1, min(max_n, end + 1) + 1):
+            code += ids[end - n + 1] * factor
+            factor *= base
+            if n >= min_n:
+                w = self._weights[n - 1].get(code)
+                if w is not None:
+                    score += w
+        return score
+
+    def max_rule_gain(self) -> float:
+        """Return an upper bound of the increase of the log-odds when a rule is
+        appended to any sequence of rules, at least 0"""
+        if self._max_rule_gain is None:
+            # the largest weight of the n-grams ending with each token, by n
+            gains = {}  # type: Dict[int, List[float]]
+            for n, weights in enumerate(self._weights):
+                for code, w in weights.items():
+                    token = code % self._base
+                    gain = gains.setdefault(token, [0.0] * len(self._weights))
+                    gain[n] = max(gain[n], w)
+            self._max_rule_gain = max((sum(g) for g in gains.values()), default=0.0)
+        return self._max_rule_gain
+
+    def _class_score(self, ids: Sequence[int]) -> float:
+        # the n-grams are counted and added like CountVectorizer.transform and
+        # MultinomialNaiveBayes.predict_log_probability do: by n, then in the
+        # order of their first occurrence
+        class_weights = self._class_weights
+        class_prior = self._class_prior
+        assert class_weights is not None and class_prior is not None
+        min_n, max_n = self.ngram_range
+        base = self._base
+        neg_score, pos_score = class_prior
+        for n in range(min_n, min(max_n, len(ids)) + 1):
+            weights = class_weights[n - 1]
+            counts = {}  # type: Dict[int, int]
+            for start in range(len(ids) - n + 1):
+                code = 0
+                for token in ids[start : start + n]:
+                    code = code * base + token
+                if code in weights:
+                    counts[code] = counts.get(code, 0) + 1
+            for code, cnt in counts.items():
+                neg, pos = weights[code]
+                pos_score += pos * cnt
+                neg_score += neg * cnt
+        log_prob_x = _log_sum_exp([neg_score, pos_score])
+        return (pos_score - log_prob_x) - (neg_score - log_prob_x)
+
+    def score(self, rules: Sequence[Hashable]) -> float:
+        """Return the log-odds for the sequence of rule identifiers *rules*"""
+        ids = self._ids(rules)
+        if self._class_weights is not None:
+            return self._class_score(ids)
+        score = self.prior
+        for end in range(len(ids)):
+            score = self._add_ngrams_ending_at(score, ids, end)
+        return score
+
+    def score_partial_parse(self, partial_parse: PartialParse) -> float:
+        """Return the log-odds for the rules of *partial_parse*.
+
+        The result is stored on the partial parse and passed on to the partial
+        parses derived from it by `PartialParse.apply_rule`. As these extend
+        the rules by exactly one, only the n-grams ending with the new rule
+        need to be added to the log-odds of the parent.
+        """
+        rules = partial_parse.rules
+        state = partial_parse.log_odds
+        if state is not None and state[0] is self:
+            n_rules, score = state[1], state[2]
+            if n_rules == len(rules):
+                return score
+            if n_rules == len(rules) - 1 and self._class_weights is None:
+                max_n = self.ngram_range[1]
+                ids = self._ids(rules[-max_n:])
+                score = self._add_ngrams_ending_at(score, ids, len(ids) - 1)
+                partial_parse.log_odds = (self, len(rules), score)
+                return score
+        score = self.score(rules)
+        partial_parse.log_odds = (self, len(rules), score)
+        return score
@@ -0,0 +1,130 @@
+"""Vectorized NumPy implementation of the naive bayes estimator and the count
+vectorizer.
+
+NumPy is an optional dependency (``pip install timenlp[numpy]``). If it is
+installed, `MultinomialNaiveBayes` and `CountVectorizer` use the functions in
+this module for training and bulk prediction; otherwise they fall back to pure
+python. Results agree with the pure python implementation up to floating point
+rounding.
+"""
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Dict, List, Mapping, NamedTuple, Sequence, Tuple
+
+
+@lru_cache(maxsize=None)
+def numpy_or_none() -> Any:
+    """Return the numpy module or None if it is not installed"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _numpy() -> Any:
+    np = numpy_or_none()
+    if np is None:
+        raise ImportError("NumPy is required, install it with timenlp[numpy]")
+    return np
+
+
+class CSRMatrix(NamedTuple):
+    """Sparse document-term matrix in compressed sparse row format: the counts
+    of document ``i`` are ``data[indptr[i]:indptr[i + 1]]`` for the features
+    ``indices[indptr[i]:indptr[i + 1]]``."""
+
+    data: Any
+    indices: Any
+    indptr: Any
+    shape: Tuple[int, int]
+
+
+def csr_from_dicts(X: Sequence[Dict[int, int]], n_features: int) -> CSRMatrix:
+    """Create a CSR matrix from a sequence of sparse {feature_index: count}
+    dictionaries"""
+    np = _numpy()
+    doc_lengths = np.fromiter(map(len, X), dtype=np.int64, count=len(X))
+    n_entries = int(doc_lengths.sum())
+    indices = np.fromiter(chain.from_iterable(X), dtype=np.int64, count=n_entries)
+    data = np.fromiter(
+        chain.from_iterable(x.values() for x in X), dtype=np.float64, count=n_entries
+    )
+    indptr = np.concatenate((np.zeros(1, dtype=np.int64), np.cumsum(doc_lengths)))
+    return CSRMatrix(data, indices, indptr, (len(X), n_features))
+
+
+def _row_ids(X: CSRMatrix) -> Any:
+    # the document index of each entry
+    np = _numpy()
+    return np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+
+
+def log_likelihood(
+    X: CSRMatrix, y: Sequence[int], alpha: float
+) -> Tuple[List[float], List[float]]:
+    """Calculate the smoothed (negative, positive) class log-likelihoods of all
+    features, see `MultinomialNaiveBayes._construct_log_likelihood`
+
+    Parameters
+    ----------
+    X : CSRMatrix
+        Document-term matrix
+    y : Sequence[int]
+        Labels +1/-1
+    alpha : float
+        Additive smoothing parameter
+
+    Returns
+    -------
+    Tuple[List[float], List[float]]
+        Log-likelihoods of the negative and the positive class for each feature
+    """
+    np = _numpy()
+    positive = (np.asarray(y) == 1)[_row_ids(X)]
+    result = []
+    for mask in (~positive, positive):
+        counts = (
+            np.bincount(
+                X.indices[mask], weights=X.data[mask], minlength=X.shape[1]
+            )
+            + alpha
+        )
+        result.append((np.log(counts) - np.log(counts.sum())).tolist())
+    return result[0], result[1]
+
+
+def predict_log_probability(
+    X: CSRMatrix,
+    class_prior: Tuple[float, float],
+    log_likelihood: Mapping[str, Sequence[float]],
+) -> Any:
+    """Calculate the posterior log probabilities of all documents at once, see
+    `MultinomialNaiveBayes.predict_log_probability`
+
+    Parameters
+    ----------
+    X : CSRMatrix
+        Document-term matrix
+    class_prior : Tuple[float, float]
+        Log-priors of the negative and the positive class
+    log_likelihood : Mapping[str, Sequence[float]]
+        Log-likelihoods of the features as fitted by `MultinomialNaiveBayes`
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (number of documents, 2) with the negative-class and the
+        positive-class log probability of each document
+    """
+    np = _numpy()
+    rows = _row_ids(X)
+    joint = np.empty((X.shape[0], 2))
+    for col, cls in enumerate(("negative_class", "positive_class")):
+        weights = np.asarray(log_likelihood[cls], dtype=np.float64)
+        joint[:, col] = class_prior[col] + np.bincount(
+            rows, weights=X.data * weights[X.indices], minlength=X.shape[0]
+        )
+    # Normalize the scores
+    log_prob_x = np.logaddexp(joint[:, 0], joint[:, 1])
+    return joint - log_prob_x[:, np.newaxis]
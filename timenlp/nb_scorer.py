@@ -3,18 +3,30 @@ import bz2
 import math
 import pickle
 from datetime import datetime
-from typing import Sequence
+from typing import List, Optional, Sequence, Union
 
 from timenlp.nb_estimator import MultinomialNaiveBayes
 from timenlp.count_vectorizer import CountVectorizer
 from timenlp.pipeline import TimeNLPPipeline
-from .scorer import Scorer
+from .nb_model import (
+    BinaryNaiveBayesModel,
+    NGramWeights,
+    is_binary_model,
+    save_binary_model,
+)
+from .scorer import Scorer, memoized_model_score
 from .partial_parse import PartialParse
-from .types import Artifact
+from .rule import latent_rules_chain
+from .types import Artifact, RegexMatch
 
 
 class NaiveBayesScorer(Scorer):
-    def __init__(self, nb_model: TimeNLPPipeline) -> None:
+    # the model score is the log-odds of the n-grams of the rules
+    rules_only = True
+
+    def __init__(
+        self, nb_model: Union[TimeNLPPipeline, BinaryNaiveBayesModel]
+    ) -> None:
         """Scorer based on a naive bayes estimator.
 
         This scorer models the probability of having a correct parse, conditioned
@@ -28,25 +40,56 @@ class NaiveBayesScorer(Scorer):
             A scikit-learn style Estimator that was trained on a corpus that takes
             a Sequence[Sequence[str]] as X (each entry is a sequence of rule
             identifiers) and a Sequence[int] in the set {-1, 1} that indicates if
-            the parse was correct or incorrect.
+            the parse was correct or incorrect. Alternatively a model loaded
+            from the binary format, see `timenlp.nb_model`.
         """
         self._model = nb_model
+        # built on first use, see model_score
+        self._ngram_weights: Optional[NGramWeights] = None
 
     @classmethod
     def from_model_file(cls, fname: str) -> "NaiveBayesScorer":
+        """Load a scorer from a model saved with `save_naive_bayes` or
+        `save_naive_bayes_binary`; the format is detected from the file."""
+        if is_binary_model(fname):
+            return cls(BinaryNaiveBayesModel(fname))
         with bz2.open(fname, "rb") as fd:
             return cls(pickle.load(fd))
 
+    def model_score(self, partial_parse: PartialParse) -> float:
+        # NOTE: the prediction is log-odds, or logit. Instead of going through
+        # _feature_extractor and the pipeline, the rules are mapped directly to
+        # the weights of their n-grams. The scores of a pipeline are identical
+        # to predict_log_proba, those of a binary model are computed
+        # incrementally from the parent partial parse.
+        return self._get_ngram_weights().score_partial_parse(partial_parse)
+
+    def _memoized_model_score(self, partial_parse: PartialParse) -> float:
+        score = memoized_model_score(self, partial_parse)
+        # model_score is not called on a cache hit: store the score all the
+        # same, so the partial parses derived from this one are scored
+        # incrementally
+        weights = self._get_ngram_weights()
+        n_rules = len(partial_parse.rules)
+        state = partial_parse.log_odds
+        if state is None or state[0] is not weights or state[1] != n_rules:
+            partial_parse.log_odds = (weights, n_rules, score)
+        return score
+
+    def _get_ngram_weights(self) -> NGramWeights:
+        if self._ngram_weights is None:
+            if isinstance(self._model, BinaryNaiveBayesModel):
+                self._ngram_weights = NGramWeights.from_binary_model(self._model)
+            else:
+                self._ngram_weights = NGramWeights.from_pipeline(self._model)
+        return self._ngram_weights
+
     def score(self, txt: str, ts: datetime, partial_parse: PartialParse) -> float:
         # Penalty for partial matches
         max_covered_chars = partial_parse.prod[-1].mend - partial_parse.prod[0].mstart
         len_score = math.log(max_covered_chars / len(txt))
 
-        X = _feature_extractor(txt, ts, partial_parse)
-        pred = self._model.predict_log_proba([X])
-
-        # NOTE: the prediction is log-odds, or logit
-        model_score = pred[0][1] - pred[0][0]
+        model_score = self._memoized_model_score(partial_parse)
 
         return model_score + len_score
 
@@ -58,17 +101,60 @@ class NaiveBayesScorer(Scorer):
         # production
         len_score = math.log(len(prod) / len(txt))
 
-        X = _feature_extractor(txt, ts, partial_parse)
-        pred = self._model.predict_log_proba([X])
-
-        # NOTE: the prediction is log-odds, or logit
-        model_score = pred[0][1] - pred[0][0]
+        model_score = self._memoized_model_score(partial_parse)
 
         # We want the len_score to always take precedence. I believe a logit won't go up
         # more than 1000. A better way would be to return an ordering tuple instead,
         # but then we would need to change many interfaces.
         return model_score + 1000 * len_score
 
+    def final_score_bound(
+        self, txt: str, ts: datetime, partial_parse: PartialParse
+    ) -> float:
+        # No production derived from the partial parse covers more than its
+        # max_covered_chars and each rule applied adds at most max_rule_gain to
+        # the model score. Of n artifacts, r of them regex matches, at most
+        # n - 1 rules combine several artifacts and r rules turn a single regex
+        # match into an artifact. This leaves at most 2n - 1 artifacts for the
+        # rules taking a single other artifact (the latent rules), as long as
+        # they are never applied to each other's results.
+        if latent_rules_chain():
+            return math.inf
+        n = len(partial_parse.prod)
+        r = sum(1 for a in partial_parse.prod if type(a) is RegexMatch)
+        max_rules = r + (n - 1) + (2 * n - 1)
+        model_score = self._memoized_model_score(partial_parse)
+        len_score = math.log(partial_parse.max_covered_chars / len(txt))
+        return (
+            model_score
+            + max_rules * self._get_ngram_weights().max_rule_gain()
+            + 1000 * len_score
+        )
+
+    def score_batch(
+        self, txt: str, ts: datetime, partial_parses: Sequence[PartialParse]
+    ) -> List[float]:
+        log = math.log
+        len_txt = len(txt)
+        return [
+            self._memoized_model_score(pp)
+            + log((pp.prod[-1].mend - pp.prod[0].mstart) / len_txt)
+            for pp in partial_parses
+        ]
+
+    def score_final_batch(
+        self,
+        txt: str,
+        ts: datetime,
+        partial_parse: PartialParse,
+        prods: Sequence[Artifact],
+    ) -> List[float]:
+        # the model score is the same for all productions
+        model_score = self._memoized_model_score(partial_parse)
+        log = math.log
+        len_txt = len(txt)
+        return [model_score + 1000 * log(len(prod) / len_txt) for prod in prods]
+
 
 def _feature_extractor(
     txt: str, ts: datetime, partial_parse: PartialParse
@@ -92,3 +178,9 @@ def save_naive_bayes(model: TimeNLPPipeline, fname: str) -> None:
     # TODO: version this model and dump metadata with lots of information
     with bz2.open(fname, "wb") as fd:
         pickle.dump(model, fd)
+
+
+def save_naive_bayes_binary(model: TimeNLPPipeline, fname: str) -> None:
+    """Save a naive bayes model for NaiveBayesScorer in the memory mappable
+    binary format, see `timenlp.nb_model`"""
+    save_binary_model(model, fname)
@@ -1,7 +1,9 @@
 import logging
 from datetime import datetime
 from typing import (
+    Any,
     Callable,
+    FrozenSet,
     Optional,
     Sequence,
     Tuple,
@@ -12,6 +14,8 @@ from typing import (
     Generator,
 )
 
+from . import rule as rule_module
+from .cache import LRUCache
 from .rule import rules as global_rules, ProductionRule, Predicate
 from .timers import timeit
 from .types import Artifact, RegexMatch
@@ -32,6 +36,8 @@ class PartialParse:
         * rules: the sequence of regular expressions and rules used/applied to produce
                  prod
         * score: the score assigned to this production
+        * log_odds: running state of the scorer, passed on to the partial parses
+                    derived from this one, see `NGramWeights.score_partial_parse`
         """
         if len(prod) < 1:
             raise ValueError("prod should have at least one element")
@@ -41,25 +47,35 @@ class PartialParse:
         self.applicable_rules = global_rules
         self.max_covered_chars = self.prod[-1].mend - self.prod[0].mstart
         self.score = 0.0
+        self.log_odds = None  # type: Optional[Tuple[object, int, float]]
 
     @classmethod
     def from_regex_matches(
-        cls, regex_matches: Tuple[RegexMatch, ...]
+        cls,
+        regex_matches: Tuple[RegexMatch, ...],
+        applicable_rules: Optional[
+            Dict[str, Tuple[ProductionRule, List[Predicate]]]
+        ] = None,
     ) -> "PartialParse":
         """Create partial production from a series of RegexMatch
 
         This usually is called when no production rules (with the exception of
         regex matches) have been applied.
 
+        :param applicable_rules: the rules applicable to *regex_matches* as
+          determined by an earlier call; filtered from all rules if not given
         """
         se = cls(prod=regex_matches, rules=tuple(r.id for r in regex_matches))
+        if applicable_rules is not None:
+            se.applicable_rules = applicable_rules
+            return se
 
         logger.debug("=" * 80)
         logger.debug("-> checking rule applicability")
         # Reducing rules to only those applicable has no effect for
         # small stacks, but on larger there is a 10-20% speed
         # improvement
-        se.applicable_rules, _ts = timeit(se._filter_rules)(global_rules)
+        se.applicable_rules, _ts = timeit(_applicable_rules)(se.prod)
         logger.debug(
             "of {} total rules {} are applicable in {}".format(
                 len(global_rules), len(se.applicable_rules), se.prod
@@ -98,6 +114,7 @@ class PartialParse:
             )
 
             pp.applicable_rules = self.applicable_rules
+            pp.log_odds = self.log_odds
             return pp
         else:
             return None
@@ -138,6 +155,107 @@ class PartialParse:
         }
 
 
+_RuleTable = Dict[str, Tuple[ProductionRule, List[Predicate]]]
+
+
+class _RuleIndex:
+    def __init__(self, rules: _RuleTable) -> None:
+        """Index of the regular expressions that *rules* require.
+
+        A rule can be applied to a sequence of artifacts (see _seq_match) iff
+        the regexes of its pattern occur in the sequence in the same order,
+        with at least one element for each other predicate at the respective
+        position. Only the rules that require some regex of the sequence - or
+        none at all - need to be checked.
+        """
+        # the pattern of each rule: the regex id or None for other predicates
+        self.patterns: Dict[str, Tuple[Optional[int], ...]] = {}
+        self.required: Dict[str, FrozenSet[int]] = {}
+        self.by_regex: Dict[int, List[str]] = {}
+        self.no_regex: List[str] = []
+        # rules whose patterns are not understood, checked with _seq_match
+        self.other: List[str] = []
+        self.position = {name: i for i, name in enumerate(rules)}
+        for name, (_, pat) in rules.items():
+            ids = []  # type: List[Optional[int]]
+            for p in pat:
+                if p.__name__ != "_regex_match":
+                    ids.append(None)
+                elif rule_module._predicate_regex.get(p) is not None:
+                    ids.append(rule_module._predicate_regex[p])
+                else:
+                    break
+            else:
+                self.patterns[name] = tuple(ids)
+                required = frozenset(i for i in ids if i is not None)
+                self.required[name] = required
+                if not required:
+                    self.no_regex.append(name)
+                for r_id in required:
+                    self.by_regex.setdefault(r_id, []).append(name)
+                continue
+            self.other.append(name)
+
+
+_rule_index = None  # type: Optional[Tuple[int, _RuleIndex]]
+# applicable rules by regex ids of the production, see _applicable_rules
+_applicable_cache = LRUCache(maxsize=4096)  # type: LRUCache[_RuleTable]
+
+
+def _is_subsequence(pattern: Tuple[Optional[int], ...], ids: Tuple[Any, ...]) -> bool:
+    # Greedily align the pattern with the earliest possible elements: a regex
+    # id must match the id of the element, None matches any element.
+    i = 0
+    n = len(ids)
+    for r_id in pattern:
+        if r_id is None:
+            if i >= n:
+                return False
+            i += 1
+        else:
+            try:
+                i = ids.index(r_id, i) + 1
+            except ValueError:
+                return False
+    return True
+
+
+def _applicable_rules(prod: Sequence[Artifact]) -> _RuleTable:
+    # Same as PartialParse._filter_rules(global_rules), using the rule index
+    # and memoized by the regex ids of the production.
+    global _rule_index
+    version = rule_module._rules_version
+    if _rule_index is None or _rule_index[0] != version:
+        _rule_index = (version, _RuleIndex(global_rules))
+    index = _rule_index[1]
+
+    ids = tuple(a.id if type(a) is RegexMatch else None for a in prod)
+    key = (ids, version)
+    applicable = _applicable_cache.get(key)
+    if applicable is not None:
+        return applicable
+
+    present = {r_id for r_id in ids if r_id is not None}
+    candidates = set(index.no_regex)
+    for r_id in present:
+        candidates.update(index.by_regex.get(r_id, ()))
+    names = [
+        name
+        for name in candidates
+        if index.required[name] <= present
+        and _is_subsequence(index.patterns[name], ids)
+    ]
+    names.extend(
+        name
+        for name in index.other
+        if next(_seq_match(prod, global_rules[name][1]), None) is not None
+    )
+    names.sort(key=index.position.__getitem__)
+    applicable = {name: global_rules[name] for name in names}
+    _applicable_cache.put(key, applicable)
+    return applicable
+
+
 def _seq_match(
     seq: Sequence[T], pat: Sequence[Callable[[T], bool]], offset: int = 0
 ) -> Generator[List[int], None, None]:
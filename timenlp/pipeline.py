@@ -1,4 +1,4 @@
-from typing import Sequence, Tuple
+from typing import Any, Sequence, Tuple
 
 from .nb_estimator import MultinomialNaiveBayes
 from .count_vectorizer import CountVectorizer
@@ -51,3 +51,21 @@ class TimeNLPPipeline:
         """
         X_transformed = self.transformer.transform(X)
         return self.estimator.predict_log_probability(X_transformed)
+
+    def predict_log_proba_batch(self, X: Sequence[Sequence[str]]) -> Any:
+        """Like `predict_log_proba`, but vectorized for many documents. Requires
+        NumPy.
+
+        Parameters
+        ----------
+        X : Sequence[Sequence[str]]
+            Sequence of documents, each as sequence of tokens
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (number of documents, 2) with the negative/positive log
+            probability of each document
+        """
+        X_transformed = self.transformer.transform_csr(X)
+        return self.estimator.predict_log_probability_csr(X_transformed)
@@ -0,0 +1,326 @@
+"""Literal keyword prefilter for the rule regular expressions.
+
+For each rule regex a few sets of literal anchors are extracted when the rule
+is registered, such that every match of the regex contains at least one anchor
+of each set (e.g. a digit and one of "day" or "week"). Before matching, a
+single keyword scan over the text determines which anchors are present and
+hence which regexes can possibly match; all others are skipped.
+
+The extraction is conservative: whenever a construct is not understood, the
+regex gets no anchors and is always matched.
+"""
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import regex
+
+try:
+    from re import _parser as sre_parse  # type: ignore
+except ImportError:  # pragma: no cover - python < 3.11
+    import sre_parse
+
+# maximal number of alternatives kept when expanding literals, e.g. for
+# character classes or alternations of keywords
+_MAX_LITERALS = 64
+
+_DIGITS = frozenset("0123456789")
+
+# Syntax of the regex module (mostly VERSION1) that the stdlib parser does not
+# understand or interprets differently. Patterns using any of these get no
+# anchors. A `{` that does not start a numeric repeat could be a fuzzy match.
+_UNSUPPORTED = regex.compile(
+    r"\[\[|\\[pPLXmMKG]|\(\?[|&R>]|\(\?P>|\(\?\d|\(\?\(DEFINE|\(\?[rfebw]"
+    r"|&&|--|~~|\|\||\{(?![\d,]*\})"
+)
+
+# a digit that the regex module matches with \d, but which is not 0-9
+_OTHER_DIGIT = regex.compile(r"(?![0-9])\d", regex.VERSION1)
+
+_NON_ASCII = regex.compile(r"[^\x00-\x7f]")
+
+
+def _isascii(s: str) -> bool:
+    # same as str.isascii, which needs python 3.7
+    return _NON_ASCII.search(s) is None
+
+
+# exact: all strings a (sub-)pattern can match, None if unknown
+# clauses: every match contains at least one string of each of these sets
+_Info = Tuple[Optional[FrozenSet[str]], List[FrozenSet[str]]]
+
+# keep only this many sets of required literals per regex
+_MAX_CLAUSES = 4
+
+
+def required_literals(pattern: str) -> Optional[List[FrozenSet[str]]]:
+    """Return sets of literals such that every match of *pattern* contains at
+    least one literal of each set.
+
+    The pattern is assumed to be matched case-insensitively, hence the literals
+    are case-folded. Returns ``None`` if no set of ASCII literals can be
+    determined.
+
+    :param pattern: a regular expression with any (?&name) calls already expanded
+    """
+    if _UNSUPPORTED.search(pattern):
+        return None
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:  # noqa: B902 - anything the stdlib parser rejects
+        return None
+    exact, clauses = _seq_info(list(parsed))
+    if _is_anchor(exact):
+        clauses = clauses + [exact]  # type: ignore
+    # see normalize_text: only ASCII literals can be found reliably
+    minimal = {_minimize(c) for c in clauses if all(_isascii(a) for a in c)}
+    # drop sets that are implied by another set, e.g. "end" by "end of"
+    result = [c for c in minimal if not any(d != c and _implies(d, c) for d in minimal)]
+    if not result:
+        return None
+    return sorted(result, key=_selectivity)[:_MAX_CLAUSES]
+
+
+_fold_cache: Dict[str, str] = {}
+
+
+def _fold_char(c: str) -> str:
+    folded = _fold_cache.get(c)
+    if folded is None:
+        folded = c.casefold()
+        if not _isascii(folded):
+            # e.g. a dotted capital I matches a plain i case-insensitively
+            folded = next(
+                (
+                    a
+                    for a in "abcdefghijklmnopqrstuvwxyz"
+                    if regex.fullmatch(a, c, regex.IGNORECASE | regex.VERSION1)
+                ),
+                folded,
+            )
+        _fold_cache[c] = folded
+    return folded
+
+
+def normalize_text(txt: str) -> str:
+    """Normalize a text for a keyword scan against the required literals.
+
+    Every character that a case-insensitive regex matches with an ASCII
+    literal is mapped to that literal (e.g. a sharp s to "ss").
+    """
+    if _isascii(txt):
+        return txt.lower()
+    return "".join(c.lower() if c < "\x80" else _fold_char(c) for c in txt)
+
+
+def min_match_length(pattern: str) -> Optional[int]:
+    """Return the minimal length of a match of *pattern* or ``None`` if the
+    pattern uses constructs that are not understood.
+
+    :param pattern: a regular expression with any (?&name) calls already expanded
+    """
+    if _UNSUPPORTED.search(pattern):
+        return None
+    try:
+        return int(sre_parse.parse(pattern).getwidth()[0])
+    except Exception:  # noqa: B902 - anything the stdlib parser rejects
+        return None
+
+
+def _is_anchor(literals: Optional[FrozenSet[str]]) -> bool:
+    return literals is not None and len(literals) > 0 and "" not in literals
+
+
+def _minimize(literals: FrozenSet[str]) -> FrozenSet[str]:
+    # a literal containing another literal of the set is redundant
+    return frozenset(
+        a for a in literals if not any(b != a and b in a for b in literals)
+    )
+
+
+def _implies(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    # a text with a literal of a also contains a literal of b
+    return all(any(y in x for y in b) for x in a)
+
+
+def _selectivity(literals: FrozenSet[str]) -> Tuple[int, int, List[str]]:
+    # sets that are less likely to be found in a text first: long literals,
+    # then few alternatives
+    return (-min(len(a) for a in literals), len(literals), sorted(literals))
+
+
+def _best(info: _Info) -> Optional[FrozenSet[str]]:
+    exact, clauses = info
+    candidates = [_minimize(c) for c in clauses]
+    if _is_anchor(exact):
+        candidates.append(_minimize(exact))  # type: ignore
+    if not candidates:
+        return None
+    return min(candidates, key=_selectivity)
+
+
+def _product(a: FrozenSet[str], b: FrozenSet[str]) -> Optional[FrozenSet[str]]:
+    if len(a) * len(b) > _MAX_LITERALS:
+        return None
+    return frozenset(x + y for x in a for y in b)
+
+
+def _seq_info(items: Iterable[Tuple[Any, Any]]) -> _Info:
+    # concatenation: the exact strings of adjacent items are combined as long
+    # as they are known, the requirements of all items hold for the sequence
+    exact: Optional[FrozenSet[str]] = frozenset([""])
+    run = exact
+    clauses: List[FrozenSet[str]] = []
+    for op, av in items:
+        item_exact, item_clauses = _item_info(op, av)
+        clauses.extend(item_clauses)
+        combined = None
+        if run is not None and item_exact is not None:
+            combined = _product(run, item_exact)
+        if combined is None:
+            if _is_anchor(run):
+                clauses.append(run)  # type: ignore
+            exact = None
+            run = item_exact
+        else:
+            run = combined
+            if exact is not None:
+                exact = run
+    if exact is None and _is_anchor(run):
+        clauses.append(run)  # type: ignore
+    return exact, clauses
+
+
+def _item_info(op: Any, av: Any) -> _Info:
+    if op is sre_parse.LITERAL:
+        return frozenset([chr(av).casefold()]), []
+    if op is sre_parse.IN:
+        return _in_info(av), []
+    if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        # zero width, nothing is consumed
+        return frozenset([""]), []
+    if op is sre_parse.SUBPATTERN:
+        return _seq_info(list(av[-1]))
+    if op is getattr(sre_parse, "ATOMIC_GROUP", None):
+        return _seq_info(list(av))
+    if op is sre_parse.BRANCH:
+        return _branch_info(av[1])
+    if op in (
+        sre_parse.MAX_REPEAT,
+        sre_parse.MIN_REPEAT,
+        getattr(sre_parse, "POSSESSIVE_REPEAT", None),
+    ):
+        min_rep, max_rep, sub = av
+        if min_rep == 0:
+            return None, []
+        sub_exact, sub_clauses = _seq_info(list(sub))
+        if min_rep == max_rep == 1:
+            return sub_exact, sub_clauses
+        if _is_anchor(sub_exact):
+            sub_clauses = sub_clauses + [sub_exact]  # type: ignore
+        return None, sub_clauses
+    # ANY, NOT_LITERAL, back references, conditionals, ...
+    return None, []
+
+
+def _in_info(items: List[Tuple[Any, Any]]) -> Optional[FrozenSet[str]]:
+    chars: Set[str] = set()
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            chars.add(chr(av).casefold())
+        elif op is sre_parse.RANGE:
+            if av[1] - av[0] >= _MAX_LITERALS:
+                return None
+            chars.update(chr(c).casefold() for c in range(av[0], av[1] + 1))
+        elif op is sre_parse.CATEGORY and av is sre_parse.CATEGORY_DIGIT:
+            chars.update(_DIGITS)
+        else:
+            # negated sets, other categories
+            return None
+    if len(chars) > _MAX_LITERALS:
+        return None
+    return frozenset(chars)
+
+
+def _branch_info(branches: List[Any]) -> _Info:
+    # alternatives: a match contains the best anchors of one of the branches
+    exact: Optional[FrozenSet[str]] = frozenset()
+    required: Optional[FrozenSet[str]] = frozenset()
+    for branch in branches:
+        b_info = _seq_info(list(branch))
+        b_exact = b_info[0]
+        if exact is not None:
+            exact = (
+                exact | b_exact
+                if b_exact is not None and len(exact | b_exact) <= _MAX_LITERALS
+                else None
+            )
+        b_best = _best(b_info)
+        if required is not None:
+            required = required | b_best if b_best is not None else None
+    return exact, [required] if required else []
+
+
+class KeywordIndex:
+    def __init__(self) -> None:
+        """Index of the required literals of regexes.
+
+        A regex is a candidate for a text if each of its sets of required
+        literals has at least one literal in the text. Regexes without required
+        literals are candidates for every text.
+        """
+        self._known: Set[int] = set()
+        self._anytime: Set[int] = set()
+        # ids of the distinct sets of required literals
+        self._clause_ids: Dict[FrozenSet[str], int] = {}
+        self._required: Dict[int, FrozenSet[int]] = {}
+        self._by_keyword: Dict[str, Set[int]] = {}
+        # keywords grouped by their first character for a quick scan
+        self._by_first_char: Dict[str, Set[str]] = {}
+        self._digit_keywords: Set[str] = set()
+
+    def add(self, r_id: int, clauses: Optional[List[FrozenSet[str]]]) -> None:
+        """Register regex *r_id* with its sets of required literals"""
+        self._known.add(r_id)
+        if not clauses:
+            self._anytime.add(r_id)
+            return
+        required = set()
+        for clause in clauses:
+            c_id = self._clause_ids.setdefault(clause, len(self._clause_ids))
+            required.add(c_id)
+            for kw in clause:
+                self._by_keyword.setdefault(kw, set()).add(c_id)
+                self._by_first_char.setdefault(kw[0], set()).add(kw)
+                if any(c in _DIGITS for c in kw):
+                    self._digit_keywords.add(kw)
+        self._required[r_id] = frozenset(required)
+
+    def __contains__(self, r_id: int) -> bool:
+        return r_id in self._known
+
+    def keywords(self, txt: str) -> Set[str]:
+        """Return all keywords of the index that occur in *txt*"""
+        norm = normalize_text(txt)
+        present = {
+            kw
+            for c in set(norm).intersection(self._by_first_char)
+            for kw in self._by_first_char[c]
+            if kw in norm
+        }
+        if not _isascii(norm) and _OTHER_DIGIT.search(norm):
+            # \d also matches digits of other scripts: assume any digit can occur
+            present.update(self._digit_keywords)
+        return present
+
+    def candidates(self, txt: str) -> Set[int]:
+        """Return the ids of all regexes that can possibly match *txt*"""
+        satisfied: Set[int] = set()
+        for kw in self.keywords(txt):
+            satisfied.update(self._by_keyword[kw])
+        ids = set(self._anytime)
+        if satisfied:
+            ids.update(
+                r_id
+                for r_id, required in self._required.items()
+                if required <= satisfied
+            )
+        return ids
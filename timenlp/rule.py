@@ -1,12 +1,26 @@
 # flake8: noqa F405
 import logging
+from threading import Lock
 
 from datetime import datetime
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union, Type
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    Type,
+    cast,
+)
 
 import regex
 
-from .types import Artifact, RegexMatch
+from .prefilter import KeywordIndex, min_match_length, required_literals
+from .types import Artifact, Duration, DurationUnit, Interval, RegexMatch, Time
 
 logger = logging.getLogger(__name__)
 
@@ -21,11 +35,38 @@ ProductionRule = Callable[..., Optional[Artifact]]
 
 
 rules = {}  # type: Dict[str, Tuple[ProductionRule, List[Predicate]]]
+# incremented whenever a rule is registered, e.g. to invalidate caches
+_rules_version = 0
 
 _regex_cnt = 100  # leave this much space for ids of production types
-_regex = {}  # compiled regex
+_regex = {}  # type: Dict[int, regex.Regex]  # compiled, see compiled_regexes
+# regexes that are compiled on first use, map regex id to expanded pattern
+_regex_pending = {}  # type: Dict[int, str]
+_regex_lock = Lock()
 _regex_str = {}  # map regex id to original string
 _str_regex = {}  # type: Dict[str, int] # map regex raw str to regex id
+_regex_index = KeywordIndex()  # literal anchors of the regexes
+
+# Map the predicates created by regex_match, dimension and predicate to the id
+# of the regex they accept or to None if they never accept a RegexMatch. Any
+# other callable may accept a RegexMatch.
+_predicate_regex = {}  # type: Dict[Predicate, Optional[int]]
+# Rules that can be applied to a sequence of regex matches alone, mapped to the
+# ids of the regexes they require. Every production starts with one of these.
+_seed_rules = {}  # type: Dict[str, FrozenSet[int]]
+
+# Each distinct predicate created by regex_match, dimension and predicate gets a
+# bit; an artifact's signature is the set of the bits of all predicates that
+# hold for it, and rule patterns compile to sequences of bit masks.
+_predicate_bits = {}  # type: Dict[Predicate, int]
+_bits_by_key = {}  # type: Dict[Hashable, int]
+_regex_bits = {}  # type: Dict[int, int]
+# the bits of the dimensions and predicates and one test for each
+_signature_tests = []  # type: List[Tuple[int, Predicate]]
+# the masks of the patterns of each rule, None if a pattern has no bit
+_rule_masks = {}  # type: Dict[str, Optional[Tuple[int, ...]]]
+# rules version and result of the last latent_rules_chain
+_latent_chain = None  # type: Optional[Tuple[int, bool]]
 
 _regex_hour = r"(?:[01]?\d)|(?:2[0-3])"
 _regex_minute = r"[0-5]\d"
@@ -39,17 +80,57 @@ _regex_to_join = (
     "no later than|at latest( at)?|and)"
 )
 
-_defines = (
-    r"(?(DEFINE)(?<_hour>{regex_hour})(?P<_minute>{regex_minute})"
-    "(?P<_day>{regex_day})(?P<_month>{regex_month})"
-    "(?P<_year>{regex_year}))"
-).format(
-    regex_hour=_regex_hour,
-    regex_minute=_regex_minute,
-    regex_day=_regex_day,
-    regex_month=_regex_month,
-    regex_year=_regex_year,
-)
+# named sub-expressions that rule regexes reference as ``(?&name)``
+_define_patterns = {
+    "_hour": _regex_hour,
+    "_minute": _regex_minute,
+    "_day": _regex_day,
+    "_month": _regex_month,
+    "_year": _regex_year,
+}
+
+_define_call = regex.compile(r"\(\?&(\w+)\)", regex.VERSION1)
+
+
+def _expand_defines(p: str) -> str:
+    # Replace calls to the named sub-expressions by the sub-expressions
+    # themselves. Group calls are not atomic in the regex module, so this does
+    # not change what a pattern matches, but it spares every compiled pattern
+    # its own (?(DEFINE)...) block and lets the engine optimize the inlined
+    # alternatives, which makes scanning noticeably faster.
+    def _inline(m: Any) -> str:
+        name = m.group(1)
+        if name not in _define_patterns:
+            return cast(str, m.group(0))
+        return "(?:{})".format(_define_patterns[name])
+
+    return cast(str, _define_call.sub(_inline, p))
+
+
+def _compile(r_id: int, expanded: str) -> regex.Regex:
+    return regex.compile(
+        # Removed the separator here - leads to more matches,
+        # as now each rule can also match if it is not followed
+        # or preceeded by a separator character
+        # r'(?i)(?:{sep})(?P<{re_key}>{re})(?:{sep})'.format(
+        r"(?i)(?P<R{re_key}>{re})".format(re=expanded, re_key=r_id),
+        regex.VERSION1,
+    )
+
+
+def compiled_regexes() -> Dict[int, regex.Regex]:
+    """Return the compiled regexes of all rules by regex id.
+
+    Compiling the regexes takes a noticeable share of the import time, hence
+    they are compiled (and added to the literal prefilter) on first use.
+    """
+    if _regex_pending:
+        with _regex_lock:
+            for r_id, expanded in sorted(_regex_pending.items()):
+                _regex[r_id] = _compile(r_id, expanded)
+                _regex_index.add(r_id, required_literals(expanded))
+            _regex_pending.clear()
+    return _regex
 
 
 def rule(*patterns: Union[str, Predicate]) -> Callable[[Any], ProductionRule]:
@@ -60,23 +141,14 @@ def rule(*patterns: Union[str, Predicate]) -> Callable[[Any], ProductionRule]:
             if p in _str_regex:
                 # have seen this regex before - recycle
                 return regex_match(_str_regex[p])
-            # test the regex first
-            re = r"{defines}(?i)(?P<R{re_key}>{re})".format(
-                defines=_defines, re=p, re_key=_regex_cnt
-            )
-            new_rr = regex.compile(
-                # Removed the separator here - leads to more matches,
-                # as now each rule can also match if it is not followed
-                # or preceeded by a separator character
-                # r'(?i)(?:{sep})(?P<{re_key}>{re})(?:{sep})'.format(
-                re,
-                regex.VERSION1,
-            )
-            if new_rr.match(""):
-                raise ValueError("expression {} matches empty strings".format(p))
+            expanded = _expand_defines(p)
+            if not min_match_length(expanded):
+                # test the regex first
+                if _compile(_regex_cnt, expanded).match(""):
+                    raise ValueError("expression {} matches empty strings".format(p))
             _regex_str[_regex_cnt] = p
             _str_regex[p] = _regex_cnt
-            _regex[_regex_cnt] = new_rr
+            _regex_pending[_regex_cnt] = expanded
             _regex_cnt += 1
             return regex_match(_regex_cnt - 1)
         else:
@@ -106,7 +178,21 @@ def rule(*patterns: Union[str, Predicate]) -> Callable[[Any], ProductionRule]:
                 res.update_span(*args)
             return res
 
+        global _rules_version
         rules[f.__name__] = (wrapper, mapped_patterns)
+        _rules_version += 1
+        if all(p in _predicate_bits for p in mapped_patterns):
+            _rule_masks[f.__name__] = tuple(_predicate_bits[p] for p in mapped_patterns)
+        else:
+            _rule_masks[f.__name__] = None
+        if all(_predicate_regex.get(p, -1) is not None for p in mapped_patterns):
+            _seed_rules[f.__name__] = frozenset(
+                cast(int, _predicate_regex[p])
+                for p in mapped_patterns
+                if p in _predicate_regex
+            )
+        else:
+            _seed_rules.pop(f.__name__, None)
         return wrapper
 
     return fwrapper
@@ -114,8 +200,10 @@ def rule(*patterns: Union[str, Predicate]) -> Callable[[Any], ProductionRule]:
 
 def regex_match(r_id: int) -> Predicate:
     def _regex_match(r: Artifact) -> bool:
-        return type(r) == RegexMatch and r.id == r_id  # type: ignore
+        return type(r) is RegexMatch and r.id == r_id
 
+    _predicate_regex[_regex_match] = r_id
+    _register_bit(_regex_match, ("regex", r_id))
     return _regex_match
 
 
@@ -123,6 +211,9 @@ def dimension(dim: Type[Artifact]) -> Predicate:
     def _dimension(d: Artifact) -> bool:
         return isinstance(d, dim)
 
+    if not issubclass(RegexMatch, dim):
+        _predicate_regex[_dimension] = None
+    _register_bit(_dimension, ("dimension", dim))
     return _dimension
 
 
@@ -130,7 +221,104 @@ def predicate(pred: str) -> Predicate:
     def _predicate(d: Artifact) -> Any:
         return getattr(d, pred, False)
 
+    if not hasattr(_regex_match_example, pred):
+        _predicate_regex[_predicate] = None
+    _register_bit(_predicate, ("predicate", pred))
     return _predicate
 
 
+def _register_bit(p: Predicate, key: Hashable) -> None:
+    bit = _bits_by_key.get(key)
+    if bit is None:
+        bit = 1 << len(_bits_by_key)
+        _bits_by_key[key] = bit
+        if key[0] == "regex":  # type: ignore
+            _regex_bits[key[1]] = bit  # type: ignore
+        else:
+            _signature_tests.append((bit, p))
+    _predicate_bits[p] = bit
+
+
+def signature(a: Artifact) -> int:
+    """Return the bits of all predicates created by regex_match, dimension and
+    predicate that hold for the artifact *a*.
+
+    The signature is computed once and stored on the artifact, setting any
+    attribute of the artifact discards it.
+    """
+    cached = getattr(a, "_signature", None)
+    # recompute if dimensions or predicates have been added in the meantime
+    if cached is not None and cached[0] == len(_signature_tests):
+        return cast(int, cached[1])
+    sig = _regex_bits.get(a.id, 0) if type(a) is RegexMatch else 0
+    for bit, test in _signature_tests:
+        if test(a):
+            sig |= bit
+    a._signature = (len(_signature_tests), sig)
+    return sig
+
+
+# used to check which attributes a RegexMatch has
+_regex_match_example = RegexMatch(0, regex.match(r"(?P<R0>)", ""))
+
+
+def _sample_artifacts() -> List[Artifact]:
+    # a Time for each combination of set fields, and a few other artifacts
+    fields = [
+        ("year", 2020),
+        ("month", 2),
+        ("day", 29),
+        ("hour", 10),
+        ("minute", 30),
+        ("DOW", 5),
+        ("POD", "morning"),
+    ]  # type: List[Tuple[str, Any]]
+    samples = [
+        Time(**{k: v for i, (k, v) in enumerate(fields) if n >> i & 1})
+        for n in range(1 << len(fields))
+    ]  # type: List[Artifact]
+    samples += [
+        Interval(Time(hour=10), Time(hour=12)),
+        Interval(Time(2020, 2, 1), Time(2020, 2, 29)),
+        Duration(2, DurationUnit.DAYS),
+    ]
+    return samples
+
+
+def _find_chain(latent: List[Tuple[ProductionRule, Predicate]]) -> bool:
+    for ts in (datetime(2020, 1, 15, 12, 0), datetime(2020, 12, 31, 23, 59)):
+        for a in _sample_artifacts():
+            for f, p in latent:
+                if not p(a):
+                    continue
+                try:
+                    res = f(ts, a)
+                except Exception:  # noqa: B902 - samples may not make sense
+                    continue
+                if res is not None and any(q(res) for _, q in latent):
+                    return True
+    return False
+
+
+def latent_rules_chain() -> bool:
+    """Return True if a rule taking a single artifact other than a regex match
+    (a latent rule) may apply to the result of another such rule.
+
+    Scorers bounding the number of rules in a parse assume that this never
+    happens. The check applies the latent rules to sample artifacts and only
+    finds the chains that show on these samples.
+    """
+    global _latent_chain
+    if _latent_chain is not None and _latent_chain[0] == _rules_version:
+        return _latent_chain[1]
+    latent = [
+        (f, patterns[0])
+        for f, patterns in rules.values()
+        if len(patterns) == 1 and _predicate_regex.get(patterns[0]) is None
+    ]
+    chain = _find_chain(latent)
+    _latent_chain = (_rules_version, chain)
+    return chain
+
+
 from .time.rules import *  # noqa
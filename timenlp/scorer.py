@@ -2,17 +2,40 @@
 implement scoring strategies for ctparse.
 """
 
+import math
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
 from random import Random
-from typing import Optional
+from typing import Any, List, Optional, Sequence
 
+from .cache import CacheInfo, IdentityKey, LRUCache
 from .partial_parse import PartialParse
 from .types import Artifact
 
+# model scores by scorer and rules, see memoized_model_score
+_model_score_cache = LRUCache(maxsize=32768)  # type: LRUCache[float]
+
 
 class Scorer(metaclass=ABCMeta):
-    """Interface for scoring parses generated by ctparse"""
+    """Interface for scoring parses generated by ctparse
+
+    Scorers whose score is made up of a model score, that depends on nothing
+    but the rules of the partial parse, and e.g. a length penalty can set
+    `rules_only` to True and implement `model_score`. Using
+    `memoized_model_score` the model score is then evaluated only once for each
+    sequence of rules.
+    """
+
+    rules_only = False
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        if cls.rules_only and cls.model_score is Scorer.model_score:
+            raise TypeError(
+                "{} sets rules_only but does not implement model_score".format(
+                    cls.__name__
+                )
+            )
 
     @abstractmethod
     def score(self, txt: str, ts: datetime, partial_parse: PartialParse) -> float:
@@ -35,6 +58,92 @@ class Scorer(metaclass=ABCMeta):
         :param prod: the production
         """
 
+    def score_batch(
+        self, txt: str, ts: datetime, partial_parses: Sequence[PartialParse]
+    ) -> List[float]:
+        """Produce the scores for several partial productions at once, by default
+        by calling `score` for each.
+
+        :param txt:  the text that is being parsed
+        :param ts: the reference time
+        :param partial_parses: the partial parses that need to be scored
+        """
+        return [self.score(txt, ts, pp) for pp in partial_parses]
+
+    def score_final_batch(
+        self,
+        txt: str,
+        ts: datetime,
+        partial_parse: PartialParse,
+        prods: Sequence[Artifact],
+    ) -> List[float]:
+        """Produce the final scores for several productions of one partial parse
+        at once, by default by calling `score_final` for each.
+
+        :param txt: the text that is being parsed
+        :param ts: the reference time
+        :param partial_parse: the PartialParse object that generated the productions
+        :param prods: the productions
+        """
+        return [self.score_final(txt, ts, partial_parse, prod) for prod in prods]
+
+    def final_score_bound(
+        self, txt: str, ts: datetime, partial_parse: PartialParse
+    ) -> float:
+        """Return an upper bound of the final scores of the productions of the
+        partial parse and of all partial parses derived from it, by default
+        infinity.
+
+        :param txt: the text that is being parsed
+        :param ts: the reference time
+        :param partial_parse: the partial parse
+        """
+        return math.inf
+
+    def model_score(self, partial_parse: PartialParse) -> float:
+        """Produce the part of the score that depends only on the rules of the
+        partial parse.
+
+        Scorers that set `rules_only` to True must implement it, which is
+        checked when the class is defined. Other scorers do not have a model
+        score.
+
+        :param partial_parse: the partial parse that needs to be scored
+        """
+        raise NotImplementedError(
+            "{} has no model score".format(self.__class__.__name__)
+        )
+
+
+def memoized_model_score(scorer: Scorer, partial_parse: PartialParse) -> float:
+    """Return ``scorer.model_score(partial_parse)``, looked up in a process-wide
+    cache by the rules of the partial parse if the scorer is `rules_only`."""
+    if not scorer.rules_only:
+        return scorer.model_score(partial_parse)
+    key = (IdentityKey(scorer), partial_parse.rules)
+    score = _model_score_cache.get(key)
+    if score is None:
+        score = scorer.model_score(partial_parse)
+        _model_score_cache.put(key, score)
+    return score
+
+
+def model_score_cache_info() -> CacheInfo:
+    """Return hits, misses, maximal and current size of the model score cache
+    used by `memoized_model_score`."""
+    return _model_score_cache.info()
+
+
+def model_score_cache_clear() -> None:
+    """Remove all entries from the model score cache and reset its statistics."""
+    _model_score_cache.clear()
+
+
+def set_model_score_cache_size(maxsize: int) -> None:
+    """Set the maximal number of entries in the model score cache; 0 disables
+    it."""
+    _model_score_cache.resize(maxsize)
+
 
 class DummyScorer(Scorer):
     """A scorer that always return a 0.0 score."""
@@ -47,6 +156,20 @@ class DummyScorer(Scorer):
     ) -> float:
         return 0.0
 
+    def score_batch(
+        self, txt: str, ts: datetime, partial_parses: Sequence[PartialParse]
+    ) -> List[float]:
+        return [0.0] * len(partial_parses)
+
+    def score_final_batch(
+        self,
+        txt: str,
+        ts: datetime,
+        partial_parse: PartialParse,
+        prods: Sequence[Artifact],
+    ) -> List[float]:
+        return [0.0] * len(prods)
+
 
 class RandomScorer(Scorer):
     def __init__(self, rng: Optional[Random] = None) -> None:
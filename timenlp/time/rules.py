@@ -346,7 +346,7 @@ def ruleDateDOW(ts: datetime, date: Time, dow: Time) -> Time:
 
 @rule(r"(?P<next_or_last>next|last) (?:(?P<year>years?)|(?P<month>months?))")
 def ruleNextOrLastYearOrMonth(ts: datetime, m: RegexMatch) -> Optional[Time]:
-    delta_amount = (1 if m.match.group("next_or_last") == "next" else -1)
+    delta_amount = (1 if m.match.group("next_or_last").lower() == "next" else -1)
 
     if m.match.group("year"):
         return Time(year=(ts + relativedelta(years = delta_amount)).year)
@@ -1,22 +1,41 @@
 from timenlp.time.postprocess_latent import apply_postprocessing_rules
+import copy
 import logging
+import math
+import os
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, deque
 from datetime import datetime
+from functools import lru_cache, partial
+from heapq import heappop, heappush, nlargest
+from itertools import count, islice
 from typing import (
     cast,
+    Any,
     Callable,
+    Deque,
     Dict,
+    Generator,
+    Hashable,
+    Iterable,
     Iterator,
     List,
+    NamedTuple,
     Optional,
     Sequence,
+    Set,
     Tuple,
     Union,
 )
 
 import regex
 
+from .cache import CacheInfo, IdentityKey, LRUCache
+from . import rule as rule_module
 from .partial_parse import PartialParse
-from .rule import _regex as global_regex
+from .rule import _regex_index, _rule_masks, _seed_rules, compiled_regexes, Predicate
+from .rule import signature
+from .rule import ProductionRule
 from .scorer import Scorer
 from .timers import TimeNLPTimeoutError, timeit
 
@@ -27,7 +46,24 @@ from .loader import load_default_scorer
 
 logger = logging.getLogger(__name__)
 
-_DEFAULT_SCORER = load_default_scorer()
+# loaded on first use, see _get_default_scorer
+_DEFAULT_SCORER = None  # type: Optional[Scorer]
+
+# the scorer of the timenlp_batch call a worker process belongs to
+_batch_scorer = None  # type: Optional[Scorer]
+
+# parses of recently seen texts, see _parse_cache_key
+_parse_cache = LRUCache(maxsize=1024)  # type: LRUCache[Tuple[Optional[TimeNLP], ...]]
+
+# The regex matches and applicable rules of the initial stack elements only
+# depend on the text and the parameters bounding the initial stack, not on the
+# reference time or the scorer. They are kept for recently seen texts, see
+# _initial_stack.
+_InitialStack = Tuple[
+    Tuple[Tuple[RegexMatch, ...], Dict[str, Tuple[ProductionRule, List[Predicate]]]],
+    ...,
+]
+_stage_cache = LRUCache(maxsize=1024)  # type: LRUCache[_InitialStack]
 
 
 class TimeNLP:
@@ -67,6 +103,12 @@ def timenlp(
     max_stack_depth: int = 10,
     scorer: Optional[Scorer] = None,
     latent_time: bool = True,
+    max_initial_stack: int = 1000,
+    engine: str = "stack",
+    merge_permutations: bool = False,
+    beam_width: int = 10,
+    beam_margin: float = math.inf,
+    best_only: bool = False,
 ) -> Optional[TimeNLP]:
     """Parse a string *txt* into a time expression
 
@@ -89,28 +131,344 @@ def timenlp(
     :param latent_time: if True, resolve expressions that contain only a time
                         (e.g. 8:00 pm) to be the next matching time after
                         reference time *ts*
+    :param max_initial_stack: limit the number of initial regex match sequences
+                              the search starts from (default=1000); set to 0
+                              to not limit. Overlapping matches can make the
+                              number of sequences grow exponentially.
+    :type max_initial_stack: int
+    :param engine: "stack" (default) to search the partial parses best first
+                   within the above limits, "chart" to produce every
+                   possible parse, applying each rule only once to the same
+                   sub-sequence of regex matches, or "beam" to expand the
+                   partial parses level by level, keeping only the best of each
+                   level; max_stack_depth and max_initial_stack do not apply to
+                   "chart", max_stack_depth does not apply to "beam"
+    :type engine: str
+    :param merge_permutations: if True, a production reached again by applying
+                               the same rules in a different order is not
+                               expanded again even if it scores higher; this
+                               makes the search considerably faster for long
+                               texts, in particular with max_stack_depth=0, but
+                               the parse returned may have a lower score
+                               (default=False)
+    :type merge_permutations: bool
+    :param beam_width: with engine="beam", the number of highest scored partial
+                       parses kept at each level (default=10); set to 0 to not
+                       limit
+    :type beam_width: int
+    :param beam_margin: with engine="beam", drop the partial parses of a level
+                        that score more than this below its best one
+                        (default=inf)
+    :type beam_margin: float
+    :param best_only: if True, stop the search once no partial parse left can
+                      lead to a parse scoring higher than the best one found,
+                      see `Scorer.final_score_bound` (default=False)
+    :type best_only: bool
     :returns: Optional[TimeNLP]
     """
-    parsed = timenlp_gen(
+    # TODO: keep debug for back-compatibility, but remove it later
+    if debug:
+        return timenlp_gen(  # type: ignore
+            txt,
+            ts,
+            timeout=timeout,
+            relative_match_len=relative_match_len,
+            max_stack_depth=max_stack_depth,
+            scorer=scorer,
+            latent_time=latent_time,
+            max_initial_stack=max_initial_stack,
+            engine=engine,
+            merge_permutations=merge_permutations,
+            beam_width=beam_width,
+            beam_margin=beam_margin,
+        )
+    best = timenlp_topk(
         txt,
+        1,
         ts,
         timeout=timeout,
         relative_match_len=relative_match_len,
         max_stack_depth=max_stack_depth,
         scorer=scorer,
         latent_time=latent_time,
+        max_initial_stack=max_initial_stack,
+        engine=engine,
+        merge_permutations=merge_permutations,
+        beam_width=beam_width,
+        beam_margin=beam_margin,
+        best_only=best_only,
     )
-    # TODO: keep debug for back-compatibility, but remove it later
-    if debug:
-        return parsed  # type: ignore
+    return best[0] if best else None
+
+
+def timenlp_topk(
+    txt: str,
+    k: int,
+    ts: Optional[datetime] = None,
+    timeout: Union[int, float] = 1.0,
+    relative_match_len: float = 1.0,
+    max_stack_depth: int = 10,
+    scorer: Optional[Scorer] = None,
+    latent_time: bool = True,
+    max_initial_stack: int = 1000,
+    engine: str = "stack",
+    merge_permutations: bool = False,
+    beam_width: int = 10,
+    beam_margin: float = math.inf,
+    best_only: bool = False,
+) -> List[TimeNLP]:
+    """Parse a string *txt* into its *k* highest scoring time expressions.
+
+    Only the *k* best parses are kept while the parses are generated. Of parses
+    with the same score the one generated last ranks first, hence the first
+    element is the parse `timenlp` returns.
+
+    :param k: the maximal number of parses to return
+    :param best_only: with k=1, stop the search early as described for
+                      `timenlp`; ignored otherwise
+    :returns: List[TimeNLP] ordered by descending score
+
+    The remaining parameters are the same as for `timenlp`.
+    """
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    if scorer is None:
+        scorer = _get_default_scorer()
+    if ts is None:
+        ts = datetime.now()
+    txt_pre = _preprocess_string(txt)
+    # only for the best parse the search can stop early, see _timenlp
+    best_only = best_only and k == 1
+    key = _parse_cache_key(
+        txt_pre,
+        ts,
+        relative_match_len,
+        max_stack_depth,
+        scorer,
+        latent_time,
+        max_initial_stack,
+        engine,
+        merge_permutations,
+        best_only,
+        beam_width,
+        beam_margin,
+    )
+    cached = _parse_cache.get(key)
+    if cached is None:
+        if not _may_have_parse(txt_pre):
+            logger.debug('No time expression possible in "{}"'.format(txt))
+            return []
+        parses = _timenlp_gen_uncached(
+            txt_pre,
+            ts,
+            key,
+            timeout=timeout,
+            relative_match_len=relative_match_len,
+            max_stack_depth=max_stack_depth,
+            scorer=scorer,
+            latent_time=latent_time,
+            max_initial_stack=max_initial_stack,
+            engine=engine,
+            merge_permutations=merge_permutations,
+            beam_width=beam_width,
+            beam_margin=beam_margin,
+            best_only=best_only,
+        )  # type: Iterable[Optional[TimeNLP]]
     else:
-        parsed_list = list(parsed)
-        # TODO: this way of testing a failure to find a match is a bit clunky with types
-        if len(parsed_list) == 0 or (len(parsed_list) == 1 and parsed_list[0] is None):
-            logger.warning('Failed to produce result for "{}"'.format(txt))
-            return None
-        parsed_list.sort(key=lambda p: p.score)  # type: ignore
-        return parsed_list[-1]
+        parses = cached
+    # the sequence number breaks ties in favour of the later parse
+    best = [
+        p
+        for _, _, p in nlargest(
+            k, ((p.score, i, p) for i, p in enumerate(parses) if p is not None)
+        )
+    ]
+    if not best:
+        logger.warning('Failed to produce result for "{}"'.format(txt))
+    elif cached is not None:
+        # parses stored in the cache must not be modified by the caller
+        best = copy.deepcopy(best)
+    return best
+
+
+def timenlp_batch(
+    texts: Iterable[str],
+    ts: Optional[datetime] = None,
+    workers: Optional[int] = None,
+    chunksize: int = 256,
+    timeout: Union[int, float] = 1.0,
+    relative_match_len: float = 1.0,
+    max_stack_depth: int = 10,
+    scorer: Optional[Scorer] = None,
+    latent_time: bool = True,
+    max_initial_stack: int = 1000,
+    engine: str = "stack",
+    merge_permutations: bool = False,
+    beam_width: int = 10,
+    beam_margin: float = math.inf,
+    best_only: bool = False,
+) -> List[Optional[TimeNLP]]:
+    """Parse many strings at once, spreading the work over a pool of processes.
+
+    Each worker process loads the default scorer and compiles the rule regular
+    expressions only once and then parses chunks of *chunksize* texts. The
+    results are returned in the same order as *texts*; the entry for a text
+    without a parse is ``None``.
+
+    :param texts: the strings to parse
+    :param ts: reference time used for all texts; defaults to the current time
+               at the moment of the call
+    :param workers: number of worker processes, defaults to the number of CPUs;
+                    with ``workers=1`` all texts are parsed in the calling process
+    :param chunksize: number of texts sent to a worker at once; at most two
+                      chunks per worker are pending at any time, so *texts*
+                      can be a generator that is read as the parsing progresses
+    :param scorer: the scorer is pickled and sent once to each worker, hence it
+                   must be picklable; defaults to the scorer shipped with the
+                   package
+
+    The remaining parameters are passed on to `timenlp`.
+    :returns: List[Optional[TimeNLP]]
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    if ts is None:
+        # resolve once so that all workers share the same reference time
+        ts = datetime.now()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    parse_chunk = partial(
+        _timenlp_chunk,
+        ts=ts,
+        timeout=timeout,
+        relative_match_len=relative_match_len,
+        max_stack_depth=max_stack_depth,
+        latent_time=latent_time,
+        max_initial_stack=max_initial_stack,
+        engine=engine,
+        merge_permutations=merge_permutations,
+        beam_width=beam_width,
+        beam_margin=beam_margin,
+        best_only=best_only,
+    )
+    if workers <= 1:
+        return parse_chunk(list(texts), scorer=scorer)
+
+    # imported here as it adds noticeably to the import time of the package
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+    it = iter(texts)
+    chunks = iter(lambda: list(islice(it, chunksize)), [])
+    parses: List[Optional[TimeNLP]] = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_batch_worker, initargs=(scorer,)
+    ) as pool:
+        # at most two chunks per worker are submitted at a time, so *texts* is
+        # read as the workers progress instead of all at once
+        pending: Deque["Future[List[Optional[TimeNLP]]]"] = deque(
+            pool.submit(parse_chunk, chunk) for chunk in islice(chunks, 2 * workers)
+        )
+        while pending:
+            parses.extend(pending.popleft().result())
+            for chunk in islice(chunks, 1):
+                pending.append(pool.submit(parse_chunk, chunk))
+    return parses
+
+
+def _init_batch_worker(scorer: Optional[Scorer]) -> None:
+    # load the default scorer and compile all rule regexes once at worker
+    # start-up instead of inside the first chunk. The scorer is unpickled once
+    # as well: a new object per chunk would miss the caches keyed by scorer.
+    global _batch_scorer
+    _batch_scorer = scorer
+    warmup()
+
+
+def _timenlp_chunk(
+    texts: Sequence[str], ts: datetime, **kwargs: Any
+) -> List[Optional[TimeNLP]]:
+    kwargs.setdefault("scorer", _batch_scorer)
+    return [timenlp(txt, ts, **kwargs) for txt in texts]
+
+
+def warmup() -> None:
+    """Load the default scorer and compile the regular expressions of all rules.
+
+    Both happen on first use of `timenlp` otherwise. Call this e.g. at the
+    start of a server process, so that the first request does not pay for it.
+    """
+    _get_default_scorer()
+    compiled_regexes()
+
+
+def _get_default_scorer() -> Scorer:
+    global _DEFAULT_SCORER
+    if _DEFAULT_SCORER is None:
+        _DEFAULT_SCORER = load_default_scorer()
+    return _DEFAULT_SCORER
+
+
+def parse_cache_info() -> CacheInfo:
+    """Return hits, misses, maximal and current size of the parse cache.
+
+    `timenlp` and `timenlp_gen` remember the parses of the most recently seen
+    texts. A text is looked up after preprocessing and - as all rules match
+    case-insensitively - ignoring case, together with the reference time, the
+    scorer and the search parameters. Searches that hit the timeout are not
+    cached.
+    """
+    return _parse_cache.info()
+
+
+def parse_cache_clear() -> None:
+    """Remove all entries from the parse cache and reset its statistics.
+
+    This also clears the cached regular expression matches of recent texts.
+    """
+    _parse_cache.clear()
+    _stage_cache.clear()
+    _preprocess_string.cache_clear()
+
+
+def set_parse_cache_size(maxsize: int) -> None:
+    """Set the maximal number of texts in the parse cache; 0 disables it."""
+    _parse_cache.resize(maxsize)
+
+
+def _parse_cache_key(
+    txt: str,
+    ts: datetime,
+    relative_match_len: float,
+    max_stack_depth: int,
+    scorer: Scorer,
+    latent_time: bool,
+    max_initial_stack: int,
+    engine: str,
+    merge_permutations: bool,
+    best_only: bool,
+    beam_width: int,
+    beam_margin: float,
+) -> Hashable:
+    # *txt* must be preprocessed. Lower-casing must not move any characters,
+    # otherwise the spans of the parses would differ.
+    lower = txt.lower()
+    if len(lower) == len(txt):
+        txt = lower
+    return (
+        txt,
+        ts,
+        relative_match_len,
+        max_stack_depth,
+        IdentityKey(scorer),
+        latent_time,
+        max_initial_stack,
+        engine,
+        merge_permutations,
+        best_only,
+        beam_width,
+        beam_margin,
+        rule_module._rules_version,
+    )
 
 
 def timenlp_gen(
@@ -121,6 +479,11 @@ def timenlp_gen(
     max_stack_depth: int = 10,
     scorer: Optional[Scorer] = None,
     latent_time: bool = True,
+    max_initial_stack: int = 1000,
+    engine: str = "stack",
+    merge_permutations: bool = False,
+    beam_width: int = 10,
+    beam_margin: float = math.inf,
 ) -> Iterator[Optional[TimeNLP]]:
     """Generate parses for the string *txt*.
 
@@ -128,17 +491,109 @@ def timenlp_gen(
     iterator over the matches as soon as they are produced.
     """
     if scorer is None:
-        scorer = _DEFAULT_SCORER
+        scorer = _get_default_scorer()
     if ts is None:
         ts = datetime.now()
-    for parse in _timenlp(
-        _preprocess_string(txt),
+    txt = _preprocess_string(txt)
+    key = _parse_cache_key(
+        txt,
         ts,
+        relative_match_len,
+        max_stack_depth,
+        scorer,
+        latent_time,
+        max_initial_stack,
+        engine,
+        merge_permutations,
+        False,
+        beam_width,
+        beam_margin,
+    )
+    cached = _parse_cache.get(key)
+    if cached is not None:
+        # parses stored in the cache must not be modified by the caller
+        for parse in cached:
+            yield copy.deepcopy(parse)
+        return
+    if not _may_have_parse(txt):
+        return
+    yield from _timenlp_gen_uncached(
+        txt,
+        ts,
+        key,
         timeout=timeout,
         relative_match_len=relative_match_len,
         max_stack_depth=max_stack_depth,
         scorer=scorer,
-    ):
+        latent_time=latent_time,
+        max_initial_stack=max_initial_stack,
+        engine=engine,
+        merge_permutations=merge_permutations,
+        beam_width=beam_width,
+        beam_margin=beam_margin,
+        best_only=False,
+    )
+
+
+def _timenlp_gen_uncached(
+    txt: str,
+    ts: datetime,
+    key: Hashable,
+    timeout: Union[int, float],
+    relative_match_len: float,
+    max_stack_depth: int,
+    scorer: Scorer,
+    latent_time: bool,
+    max_initial_stack: int,
+    engine: str,
+    merge_permutations: bool,
+    beam_width: int,
+    beam_margin: float,
+    best_only: bool,
+) -> Iterator[Optional[TimeNLP]]:
+    # Run the search on the preprocessed *txt* and store the parses in the
+    # parse cache under *key* once all of them have been generated. Parses of a
+    # search that timed out are incomplete and hence not stored.
+    parses = []  # type: List[Optional[TimeNLP]]
+    if engine == "stack":
+        search = _timenlp(
+            txt,
+            ts,
+            timeout=timeout,
+            relative_match_len=relative_match_len,
+            max_stack_depth=max_stack_depth,
+            scorer=scorer,
+            max_initial_stack=max_initial_stack,
+            merge_permutations=merge_permutations,
+            best_only=best_only,
+        )
+    elif engine == "chart":
+        search = _timenlp_chart(
+            txt,
+            ts,
+            timeout=timeout,
+            relative_match_len=relative_match_len,
+            scorer=scorer,
+        )
+    elif engine == "beam":
+        search = _timenlp_beam(
+            txt,
+            ts,
+            timeout=timeout,
+            relative_match_len=relative_match_len,
+            scorer=scorer,
+            beam_width=beam_width,
+            beam_margin=beam_margin,
+            max_initial_stack=max_initial_stack,
+        )
+    else:
+        raise ValueError("unknown engine {!r}".format(engine))
+    while True:
+        try:
+            parse = next(search)
+        except StopIteration as stop:
+            completed = stop.value
+            break
         if parse and latent_time:
             # NOTE: we post-process after scoring because the model has been trained
             # without using the latent time. This means also that the post processing
@@ -146,7 +601,10 @@ def timenlp_gen(
             prod = apply_postprocessing_rules(ts, parse.resolution)
             parse.resolution = prod
 
+        parses.append(copy.deepcopy(parse))
         yield parse
+    if completed:
+        _parse_cache.put(key, tuple(parses))
 
 
 def _timenlp(
@@ -156,117 +614,430 @@ def _timenlp(
     relative_match_len: float,
     max_stack_depth: int,
     scorer: Scorer,
-) -> Iterator[Optional[TimeNLP]]:
+    max_initial_stack: int = 0,
+    merge_permutations: bool = False,
+    best_only: bool = False,
+) -> Generator[Optional[TimeNLP], None, bool]:
+    # Generate the parses of the preprocessed *txt*; returns False if the search
+    # was stopped by the timeout. With best_only, parses that score lower than
+    # one emitted before are not emitted and the search stops as soon as no
+    # better parse can be derived according to scorer.final_score_bound; the
+    # highest scoring parse emitted is the same as without best_only.
     t_fun = timeout_(timeout)
 
     try:
-        logger.debug("=" * 80)
-        logger.debug("-> matching regular expressions")
-        p, _tp = timeit(_match_regex)(txt, global_regex)
-        logger.debug(f"{len(p)} expressions were matched.")
-        logger.debug("time in _match_regex: {:.0f}ms".format(1000 * _tp))
-
-        logger.debug("=" * 80)
-        logger.debug("-> building initial stack")
-        regex_stack, _ts = timeit(_regex_stack)(txt, p, t_fun)
-        logger.debug("time in _regex_stack: {:.0f}ms".format(1000 * _ts))
-        # add empty production path + counter of contained regex
-        stack = [PartialParse.from_regex_matches(s) for s in regex_stack]
+        stack = _initial_stack(
+            txt, t_fun, relative_match_len, max_stack_depth, max_initial_stack
+        )
         # TODO: the score should be kept separate from the partial parse
         # because it depends also on the text and the ts. A good idea is
         # to create a namedtuple of kind StackElement(partial_parse, score)
-        for pp in stack:
-            pp.score = scorer.score(txt, ts, pp)
+        for pp, score in zip(stack, scorer.score_batch(txt, ts, stack)):
+            pp.score = score
 
         logger.debug("initial stack length: {}".format(len(stack)))
         # sort stack by length of covered string and - if that is equal - score
-        # --> last element is longest coverage and highest scored
-        stack.sort()
+        # --> last element is longest coverage and highest scored. The stack
+        # is kept sorted by these precomputed keys; the sequence number breaks
+        # ties in the order of insertion, just like a stable sort of the
+        # partial parses would.
+        seq = count()
+        entries = sorted(
+            (pp.max_covered_chars, pp.score, next(seq), pp) for pp in stack
+        )  # type: List[Tuple[int, float, int, PartialParse]]
         # only keep initial stack elements that cover at least
         # relative_match_len characters of what the highest
         # scored/covering stack element does cover
-        stack = [
-            s
-            for s in stack
-            if s.max_covered_chars >= stack[-1].max_covered_chars * relative_match_len
-        ]
-        logger.debug("stack length after relative match length: {}".format(len(stack)))
+        entries = [e for e in entries if e[0] >= entries[-1][0] * relative_match_len]
+        logger.debug(
+            "stack length after relative match length: {}".format(len(entries))
+        )
         # limit depth of stack
-        stack = stack[-max_stack_depth:]
-        logger.debug("stack length after max stack depth limit: {}".format(len(stack)))
+        del entries[:-max_stack_depth]
+        logger.debug(
+            "stack length after max stack depth limit: {}".format(len(entries))
+        )
 
         # track what has been added to the stack and do not add again
         # if the score is not better
         stack_prod = {}  # type: Dict[Tuple[Artifact, ...], float]
         # track what has been emitted and do not emit again
         parse_prod = {}  # type: Dict[Artifact, float]
-        while stack:
+        # with merge_permutations: the rules of the partial parses added for
+        # each production, see _is_permutation
+        stack_rules = {}  # type: Dict[Tuple[Artifact, ...], List[Tuple[Any, ...]]]
+        # with best_only: the score of the best parse emitted so far and a heap
+        # of (-bound, sequence number) of the stack elements, where bound is
+        # the upper bound of the final scores of all parses derivable from the
+        # element. Elements are removed from the heap only when they surface.
+        best_score = -math.inf
+        bounds = []  # type: List[Tuple[float, int]]
+        on_stack: Set[int] = set()
+
+        def push_bound(entry: Tuple[int, float, int, PartialParse]) -> None:
+            bound = scorer.final_score_bound(txt, ts, entry[-1])
+            heappush(bounds, (-bound, entry[2]))
+            on_stack.add(entry[2])
+
+        if best_only:
+            for e in entries:
+                push_bound(e)
+        while entries:
             t_fun()
-            s = stack.pop()
+            if best_only:
+                while bounds[0][1] not in on_stack:
+                    heappop(bounds)
+                if -bounds[0][0] < best_score:
+                    # no parse derivable from the stack can score as high as
+                    # the best one, the search would only emit worse parses
+                    logger.debug("no better parse possible: stopping")
+                    break
+                on_stack.discard(entries[-1][2])
+            s = entries.pop()[-1]
             logger.debug("-" * 80)
             logger.debug("producing on {}, score={:.2f}".format(s.prod, s.score))
             new_stack_elements = []
-            for r_name, r in s.applicable_rules.items():
-                for r_match in _match_rule(s.prod, r[1]):
-                    # apply production part of rule
-                    new_s = s.apply_rule(ts, r[0], r_name, r_match)
-
-                    # TODO: We should store scores separately from the production itself
-                    # because the score may depend on the text and the ts
-                    if new_s is not None:
-                        new_s.score = scorer.score(txt, ts, new_s)
-
-                    if (
-                        new_s
-                        and stack_prod.get(new_s.prod, new_s.score - 1) < new_s.score
-                    ):
-                        # either new_s.prod has never been produced
-                        # before or the score of new_s is higher than
-                        # a previous identical production
-                        new_stack_elements.append(new_s)
-                        logger.debug(
-                            "  {} -> {}, score={:.2f}".format(
-                                r_name, new_s.prod, new_s.score
-                            )
+            children = _apply_rules(ts, s)
+
+            # TODO: We should store scores separately from the production itself
+            # because the score may depend on the text and the ts
+            scores = scorer.score_batch(txt, ts, [new_s for _, new_s in children])
+            for (r_name, new_s), score in zip(children, scores):
+                new_s.score = score
+                if stack_prod.get(new_s.prod, new_s.score - 1) < new_s.score:
+                    # either new_s.prod has never been produced
+                    # before or the score of new_s is higher than
+                    # a previous identical production
+                    if merge_permutations and _is_permutation(stack_rules, new_s):
+                        continue
+                    new_stack_elements.append(new_s)
+                    logger.debug(
+                        "  {} -> {}, score={:.2f}".format(
+                            r_name, new_s.prod, new_s.score
                         )
-                        stack_prod[new_s.prod] = new_s.score
+                    )
+                    stack_prod[new_s.prod] = new_s.score
             if not new_stack_elements:
                 logger.debug("~" * 80)
                 logger.debug("no rules applicable: emitting")
                 # no new productions were generated from this stack element.
                 # emit all (probably partial) production
-                for x in s.prod:
-                    if not isinstance(x, RegexMatch):
-                        # TODO: why do we have a different method for scoring
-                        # final productions? This is because you may have non-reducible
-                        # parses of the kind [Time, RegexMatch, Interval] or
-                        # [Time, Time] etc. In this case we want to emit those Time,
-                        # Interval parses separately and score them appropriately
-                        # (the default Scorer.score function only operates on the
-                        # whole PartialParse).
-                        score_x = scorer.score_final(txt, ts, s, x)
-                        # only emit productions not emitted before or
-                        # productions emitted before but scored higher
-                        if parse_prod.get(x, score_x - 1) < score_x:
-                            parse_prod[x] = score_x
-                            logger.debug(
-                                " => {}, score={:.2f}, ".format(x.__repr__(), score_x)
-                            )
-                            yield TimeNLP(x, s.rules, score_x)
+                # TODO: why do we have a different method for scoring
+                # final productions? This is because you may have non-reducible
+                # parses of the kind [Time, RegexMatch, Interval] or
+                # [Time, Time] etc. In this case we want to emit those Time,
+                # Interval parses separately and score them appropriately
+                # (the default Scorer.score function only operates on the
+                # whole PartialParse).
+                prods = [x for x in s.prod if not isinstance(x, RegexMatch)]
+                for x, score_x in zip(
+                    prods, scorer.score_final_batch(txt, ts, s, prods)
+                ):
+                    # only emit productions not emitted before or
+                    # productions emitted before but scored higher
+                    if parse_prod.get(x, score_x - 1) < score_x:
+                        parse_prod[x] = score_x
+                        if best_only:
+                            # only emit what may still be the best parse
+                            if score_x < best_score:
+                                continue
+                            best_score = score_x
+                        logger.debug(
+                            " => {}, score={:.2f}, ".format(x.__repr__(), score_x)
+                        )
+                        yield TimeNLP(x, s.rules, score_x)
             else:
-                # new productions generated, put on stack and sort
-                # stack by highst score
-                stack.extend(new_stack_elements)
-                stack.sort()
-                stack = stack[-max_stack_depth:]
+                # new productions generated, put on stack in the order of
+                # coverage and score
+                for new_s in new_stack_elements:
+                    entry = (new_s.max_covered_chars, new_s.score, next(seq), new_s)
+                    insort(entries, entry)
+                    if best_only:
+                        push_bound(entry)
+                if best_only and max_stack_depth:
+                    on_stack.difference_update(e[2] for e in entries[:-max_stack_depth])
+                del entries[:-max_stack_depth]
                 logger.debug(
                     "added {} new stack elements, depth after trunc: {}".format(
-                        len(new_stack_elements), len(stack)
+                        len(new_stack_elements), len(entries)
                     )
                 )
     except TimeNLPTimeoutError:
         logger.debug('Timeout on "{}"'.format(txt))
-        return
+        return False
+    return True
+
+
+def _apply_rules(ts: datetime, pp: PartialParse) -> List[Tuple[str, PartialParse]]:
+    # Apply each applicable rule of *pp* wherever it matches the production and
+    # return the rule names with the resulting partial parses.
+    children = []
+    signatures = [signature(a) for a in pp.prod]
+    for r_name, r in pp.applicable_rules.items():
+        masks = _rule_masks.get(r_name)
+        if masks is not None:
+            r_matches = _match_masks(signatures, masks)
+        else:
+            r_matches = _match_rule(pp.prod, r[1])
+        for r_match in r_matches:
+            # apply production part of rule
+            new_pp = pp.apply_rule(ts, r[0], r_name, r_match)
+            if new_pp is not None:
+                children.append((r_name, new_pp))
+    return children
+
+
+def _timenlp_beam(
+    txt: str,
+    ts: datetime,
+    timeout: float,
+    relative_match_len: float,
+    scorer: Scorer,
+    beam_width: int,
+    beam_margin: float,
+    max_initial_stack: int = 0,
+) -> Generator[Optional[TimeNLP], None, bool]:
+    # Generate the parses of the preprocessed *txt* with a beam search; returns
+    # False if the search was stopped by the timeout.
+    #
+    # Each level consists of the partial parses produced by applying one rule
+    # to the partial parses of the previous level, starting from the initial
+    # stack. Of each level only the beam_width best partial parses, in the
+    # order of the stack of _timenlp, scoring at most beam_margin below the best
+    # one are expanded; hence no more than beam_width partial parses are
+    # expanded per rule applied. As in _timenlp, a production is added only if
+    # it is new or scores higher than before, and a partial parse without new
+    # productions emits its artifacts.
+    t_fun = timeout_(timeout)
+
+    try:
+        beam = _initial_stack(
+            txt, t_fun, relative_match_len, beam_width, max_initial_stack
+        )
+        for pp, score in zip(beam, scorer.score_batch(txt, ts, beam)):
+            pp.score = score
+        if beam:
+            longest = max(pp.max_covered_chars for pp in beam)
+            min_covered_chars = longest * relative_match_len
+            beam = [pp for pp in beam if pp.max_covered_chars >= min_covered_chars]
+
+        stack_prod = {}  # type: Dict[Tuple[Artifact, ...], float]
+        parse_prod = {}  # type: Dict[Artifact, float]
+        level = 0
+        while beam:
+            best_score = max(pp.score for pp in beam)
+            beam = sorted(
+                (pp for pp in beam if pp.score >= best_score - beam_margin),
+                key=lambda pp: (pp.max_covered_chars, pp.score),
+                reverse=True,
+            )[: beam_width or None]
+            logger.debug("level {}: expanding {}".format(level, len(beam)))
+            # the partial parses of the next level by production
+            next_beam = {}  # type: Dict[Tuple[Artifact, ...], PartialParse]
+            for s in beam:
+                t_fun()
+                children = [new_s for _, new_s in _apply_rules(ts, s)]
+                new_prod = False
+                for new_s, score in zip(
+                    children, scorer.score_batch(txt, ts, children)
+                ):
+                    new_s.score = score
+                    if stack_prod.get(new_s.prod, score - 1) < score:
+                        stack_prod[new_s.prod] = score
+                        next_beam[new_s.prod] = new_s
+                        new_prod = True
+                if new_prod:
+                    continue
+                prods = [x for x in s.prod if not isinstance(x, RegexMatch)]
+                for x, score_x in zip(
+                    prods, scorer.score_final_batch(txt, ts, s, prods)
+                ):
+                    if parse_prod.get(x, score_x - 1) < score_x:
+                        parse_prod[x] = score_x
+                        yield TimeNLP(x, s.rules, score_x)
+            beam = list(next_beam.values())
+            level += 1
+    except TimeNLPTimeoutError:
+        logger.debug('Timeout on "{}"'.format(txt))
+        return False
+    return True
+
+
+def _is_permutation(
+    stack_rules: Dict[Tuple[Artifact, ...], List[Tuple[Any, ...]]],
+    pp: PartialParse,
+) -> bool:
+    # Return True if the production of *pp* has been added to the stack before
+    # by applying the same rules in another order; otherwise record its rules.
+    # Independent rules applied to disjoint parts of a production (e.g. a date
+    # on the left and a time on the right) commute, so without this check
+    # every order of them is expanded whenever it scores higher.
+    histories = stack_rules.get(pp.prod)
+    if histories is None:
+        # the common case, rules are only counted for repeated productions
+        stack_rules[pp.prod] = [pp.rules]
+        return False
+    rules = Counter(pp.rules)
+    if any(Counter(h) == rules for h in histories):
+        return True
+    histories.append(pp.rules)
+    return False
+
+
+def _timenlp_chart(
+    txt: str,
+    ts: datetime,
+    timeout: float,
+    relative_match_len: float,
+    scorer: Scorer,
+) -> Generator[Optional[TimeNLP], None, bool]:
+    # Generate the parses of the preprocessed *txt* with a chart over the
+    # regex lattice; returns False if the search was stopped by the timeout.
+    #
+    # A chart item is an artifact produced from the matches along a path
+    # first ... last of the lattice. Each rule is applied once to each
+    # combination of adjacent items and the resulting items are shared by
+    # all sequences of matches containing the path, whereas the stack search
+    # re-applies the rules to every partial parse that contains the same
+    # items. Items are built bottom-up from an agenda using partially
+    # matched rules (edges) that wait for their next argument.
+    #
+    # Every artifact that can be produced from a sequence of matches passing
+    # relative_match_len is emitted once. That is a superset of what _timenlp
+    # emits with max_stack_depth=0: it emits the artifacts of a partial
+    # parse when all of its productions have been seen before, which depends
+    # on the order of the search. The production of a parse consists of the
+    # regex ids along the path followed by the rules in the order they were
+    # applied; it is scored like a partial parse with just this production.
+    t_fun = timeout_(timeout)
+
+    try:
+        matches = _match_regex(txt, compiled_regexes())
+        lattice = _RegexLattice(txt, matches)
+        min_covered_chars = lattice.min_covered_chars(relative_match_len, 0)
+        n_rm = len(matches)
+        predecessors = [[] for _ in range(n_rm)]  # type: List[List[int]]
+        for i, (lo, hi) in enumerate(lattice.successors):
+            for j in range(lo, hi):
+                predecessors[j].append(i)
+        # the smallest start of the first match of all paths to match i
+        first_start = [m.mstart for m in matches]
+        for j in range(n_rm):
+            for i in predecessors[j]:
+                first_start[j] = min(first_start[j], first_start[i])
+
+        def covers(first: int, last: int) -> bool:
+            # there is a sequence of matches passing relative_match_len that
+            # contains the path first ... last
+            return lattice.reach_end[last] - first_start[first] >= min_covered_chars
+
+        rules = rule_module.rules
+
+        def accepts(r_name: str, pos: int, item: "_ChartItem") -> bool:
+            # the artifact of item matches element pos of the rule pattern
+            masks = _rule_masks.get(r_name)
+            if masks is not None:
+                return bool(signature(item.artifact) & masks[pos])
+            return bool(rules[r_name][1][pos](item.artifact))
+
+        # items and edges by the index of the first and the last match
+        items_by_first = [[] for _ in range(n_rm)]  # type: List[List[_ChartItem]]
+        edges_by_last = [[] for _ in range(n_rm)]  # type: List[List[_ChartEdge]]
+        seen: Set[Tuple[int, int, Artifact]] = set()
+        parse_prod = {}  # type: Dict[Artifact, float]
+        agenda: Deque[Union[_ChartItem, _ChartEdge]] = deque(
+            _ChartItem(i, i, m, (m.id,), ())
+            for i, m in enumerate(matches)
+            if covers(i, i)
+        )
+        while agenda:
+            t_fun()
+            entry = agenda.popleft()
+            if isinstance(entry, _ChartEdge):
+                edge = entry
+                if len(edge.args) == len(rules[edge.rule][1]):
+                    # the artifacts of the items are shared by other items and
+                    # the stage cache, while rules may return an argument with
+                    # its span extended: apply the rule to copies
+                    prod = rules[edge.rule][0](
+                        ts, *(copy.copy(a.artifact) for a in edge.args)
+                    )
+                    if prod is None:
+                        continue
+                    item = _ChartItem(
+                        edge.first,
+                        edge.last,
+                        prod,
+                        tuple(r for a in edge.args for r in a.regexes),
+                        tuple(r for a in edge.args for r in a.rules)
+                        + (edge.rule,),
+                    )
+                    agenda.append(item)
+                    continue
+                edges_by_last[edge.last].append(edge)
+                lo, hi = lattice.successors[edge.last]
+                for j in range(lo, hi):
+                    for item in items_by_first[j]:
+                        new_edge = edge.extend(item, accepts, covers)
+                        if new_edge is not None:
+                            agenda.append(new_edge)
+                continue
+
+            item = entry
+            key = (item.first, item.last, item.artifact)
+            if key in seen:
+                continue
+            seen.add(key)
+            items_by_first[item.first].append(item)
+            if not isinstance(item.artifact, RegexMatch):
+                pp = PartialParse((item.artifact,), item.regexes + item.rules)
+                score = scorer.score_final(txt, ts, pp, item.artifact)
+                if parse_prod.get(item.artifact, score - 1) < score:
+                    parse_prod[item.artifact] = score
+                    yield TimeNLP(item.artifact, pp.rules, score)
+            for i in predecessors[item.first]:
+                for edge in edges_by_last[i]:
+                    new_edge = edge.extend(item, accepts, covers)
+                    if new_edge is not None:
+                        agenda.append(new_edge)
+            for r_name in rules:
+                if accepts(r_name, 0, item):
+                    agenda.append(
+                        _ChartEdge(r_name, item.first, item.last, (item,))
+                    )
+    except TimeNLPTimeoutError:
+        logger.debug('Timeout on "{}"'.format(txt))
+        return False
+    return True
+
+
+class _ChartItem(NamedTuple):
+    first: int
+    last: int
+    artifact: Artifact
+    # the regex ids of the matches first ... last and the rules applied
+    regexes: Tuple[int, ...]
+    rules: Tuple[str, ...]
+
+
+class _ChartEdge(NamedTuple):
+    rule: str
+    first: int
+    last: int
+    # the items matched by the first len(args) elements of the rule pattern
+    args: Tuple[_ChartItem, ...]
+
+    def extend(
+        self,
+        item: _ChartItem,
+        accepts: Callable[[str, int, _ChartItem], bool],
+        covers: Callable[[int, int], bool],
+    ) -> Optional["_ChartEdge"]:
+        if not accepts(self.rule, len(self.args), item) or not covers(
+            self.first, item.last
+        ):
+            return None
+        return _ChartEdge(self.rule, self.first, item.last, self.args + (item,))
 
 
 # replace all comma, semicolon, whitespace, invisible control, opening and
@@ -275,6 +1046,78 @@ _repl1 = regex.compile(r"[,;\pZ\pC\p{Ps}\p{Pe}]+", regex.VERSION1)
 _repl2 = regex.compile(r"(\p{Pd}|[\u2010-\u2015]|\u2043)+", regex.VERSION1)
 
 
+def _initial_stack(
+    txt: str,
+    t_fun: Callable[[], None],
+    relative_match_len: float,
+    max_stack_depth: int,
+    max_initial_stack: int,
+) -> List[PartialParse]:
+    # Build the unscored initial stack elements for the preprocessed *txt*.
+    #
+    # The regex matches and the rules applicable to each sequence of matches
+    # are taken from the stage cache if *txt* has been seen before; the
+    # PartialParse objects are always new, as the search modifies them.
+    #
+    # Sequences that _timenlp drops right away because of relative_match_len
+    # and max_stack_depth are not built at all (see
+    # _RegexLattice.min_covered_chars). If max_initial_stack is not 0, only
+    # the max_initial_stack sequences covering the most characters are built.
+    key = (
+        txt,
+        relative_match_len,
+        max_stack_depth,
+        max_initial_stack,
+        rule_module._rules_version,
+    )
+    cached = _stage_cache.get(key)
+    if cached is not None:
+        logger.debug("-> initial stack from cache")
+        return [
+            PartialParse.from_regex_matches(prod, applicable_rules)
+            for prod, applicable_rules in cached
+        ]
+
+    logger.debug("=" * 80)
+    logger.debug("-> matching regular expressions")
+    p, _tp = timeit(_match_regex)(txt, compiled_regexes())
+    logger.debug(f"{len(p)} expressions were matched.")
+    logger.debug("time in _match_regex: {:.0f}ms".format(1000 * _tp))
+
+    logger.debug("=" * 80)
+    logger.debug("-> building initial stack")
+    lattice = _RegexLattice(txt, p)
+    min_covered_chars = lattice.min_covered_chars(relative_match_len, max_stack_depth)
+    if max_initial_stack:
+        indices = list(
+            islice(
+                lattice.longest_stacks(min_covered_chars, t_fun),
+                max_initial_stack + 1,
+            )
+        )
+        if len(indices) > max_initial_stack:
+            logger.warning(
+                "initial stack limited to the {} regex match sequences covering "
+                "the most characters".format(max_initial_stack)
+            )
+            del indices[max_initial_stack:]
+        indices.sort(key=_RegexLattice.order_key)
+    else:
+        indices = list(lattice.stacks(min_covered_chars, t_fun))
+    regex_stack = [tuple(p[i] for i in s) for s in indices]
+    # add empty production path + counter of contained regex
+    stack = [PartialParse.from_regex_matches(s) for s in regex_stack]
+    _stage_cache.put(
+        key,
+        tuple(
+            (cast(Tuple[RegexMatch, ...], pp.prod), pp.applicable_rules)
+            for pp in stack
+        ),
+    )
+    return stack
+
+
+@lru_cache(maxsize=1024)
 def _preprocess_string(txt: str) -> str:
     return cast(
         str, _repl2.sub("-", _repl1.sub(" ", txt, concurrent=True).strip()).strip()
@@ -304,6 +1147,25 @@ def _match_rule(
         i_s += 1
 
 
+def _match_masks(
+    signatures: Sequence[int], masks: Sequence[int]
+) -> Iterator[Tuple[int, int]]:
+    # Same as _match_rule, but on the signatures of the artifacts (see
+    # rule.signature) and the bit masks of the rule's predicates.
+    s_len = len(signatures)
+    r_len = len(masks)
+    if not s_len or not r_len:
+        return
+    first = masks[0]
+    for i_s in range(s_len - r_len + 1):
+        if signatures[i_s] & first:
+            i_r = 1
+            while i_r < r_len and signatures[i_s + i_r] & masks[i_r]:
+                i_r += 1
+            if i_r == r_len:
+                yield i_s, i_s + r_len
+
+
 def _match_regex(txt: str, regexes: Dict[int, regex.Regex]) -> List[RegexMatch]:
     # Match a collection of regexes in *txt*
     #
@@ -311,16 +1173,61 @@ def _match_regex(txt: str, regexes: Dict[int, regex.Regex]) -> List[RegexMatch]:
     # :param txt: the text to match against
     # :param regexes: a collection of regexes name->pattern
     # :return: a list of RegexMatch objects ordered my RegexMatch.mstart
+    #
+    # Each distinct pattern is scanned over the text once. Merging all patterns
+    # into a single alternation or a single pattern of capturing lookaheads (to
+    # scan the text only once) is 3-10x slower with the regex module, as the
+    # merged pattern loses the per-pattern literal prefix optimizations and has
+    # to try every alternative at every position. Instead, the patterns are
+    # compiled without a DEFINE block (see rule._expand_defines) and no
+    # per-match work is done here beyond building the RegexMatch.
+    #
+    # Regexes registered via rule.rule are skipped if the text lacks their
+    # required literals (see prefilter.KeywordIndex).
+    candidates = _regex_index.candidates(txt)
     matches = {
         RegexMatch(name, m)
         for name, re in regexes.items()
+        if name in candidates or name not in _regex_index
         for m in re.finditer(txt, overlapped=True, concurrent=True)
     }
-    for m in matches:
-        logger.debug("regex: {}".format(m.__repr__()))
+    if logger.isEnabledFor(logging.DEBUG):
+        for m in matches:
+            logger.debug("regex: {}".format(m.__repr__()))
     return sorted(matches, key=lambda x: (x.mstart, x.mend))
 
 
+def _may_have_parse(txt: str) -> bool:
+    # Return False if *txt* provably has no parse.
+    #
+    # Every parse starts with the application of a rule that only consists of
+    # regular expressions (see rule._seed_rules). If for none of these rules
+    # all regular expressions match, there is nothing to produce from. The
+    # literal prefilter narrows down the regexes that need to be tried.
+    regexes = compiled_regexes()
+    candidates = _regex_index.candidates(txt)
+    found = {}  # type: Dict[int, bool]
+    for ids in _seed_rules.values():
+        if not ids <= candidates and any(
+            r_id in _regex_index for r_id in ids - candidates
+        ):
+            continue
+        for r_id in ids:
+            if r_id not in found:
+                found[r_id] = (
+                    r_id in regexes
+                    and regexes[r_id].search(txt, concurrent=True) is not None
+                )
+            if not found[r_id]:
+                break
+        else:
+            return True
+    return False
+
+
+_whitespace_regex = regex.compile(r"\s+", regex.VERSION1)
+
+
 def _regex_stack(
     txt: str,
     regex_matches: List[RegexMatch],
@@ -369,54 +1276,157 @@ def _regex_stack(
     #   * if no new continuation could be generated for s, this sequence of
     #     RegexMatch is appended to the list of results.
 
+    lattice = _RegexLattice(txt, regex_matches)
     prods = []
-    n_rm = len(regex_matches)
-    # Calculate the upper triangle of an n_rm x n_rm matrix M where
-    # M[i, j] == 1 (for i<j) iff the expressions i and j are
-    # consecutive (i.e. there is no gap and they can be put together
-    # in one sequence).
-
-    # import numpy as np
-    # M = np.zeros(shape=(n_rm, n_rm), dtype=int)
-
-    # --> avoid use of numpy here; since we need column sums below,
-    # --> the representation of M is columns major, i.e. M[i] is the i-th
-    # --> column; M[i, j] then basically becomes M[j][i]
-    M = [[0 for _ in range(n_rm)] for _ in range(n_rm)]
-
-    _separator_regex = regex.compile(r"\s*", regex.VERSION1)
-
-    def get_m_dist(m1: RegexMatch, m2: RegexMatch) -> int:
-        # 1 if there is no relevant gap between m1 and m2, 0 otherwise
-        # assumes that m1 and m2 are sorted be their start index
-        if m2.mstart < m1.mend:
-            return 0  # Overlap
-        gap_match = _separator_regex.fullmatch(txt[m1.mend : m2.mstart])
-        if gap_match:
-            return 1  # No Gap
-        else:
-            return 0  # Gap
-
-    for i in range(n_rm):
-        for j in range(i + 1, n_rm):
-            M[j][i] = get_m_dist(regex_matches[i], regex_matches[j])
-
-    # NOTE(glanaro): I believe this means that this is a beginning node.
-    # why reversed?
-    stack = [
-        (i,) for i in reversed(range(n_rm)) if sum(M[i]) == 0
-    ]  # type: List[Tuple[int, ...]]
-    while stack:
-        on_do_iter()
-        s = stack.pop()
-        i = s[-1]
-        new_prod = False
-        for j in range(i + 1, n_rm):
-            if M[j][i] == 1:
-                stack.append(s + (j,))
-                new_prod = True
-        if not new_prod:
-            prod = tuple(regex_matches[i] for i in s)
-            logger.debug("regex stack {}".format(prod))
-            prods.append(prod)
+    for s in lattice.stacks(on_do_iter=on_do_iter):
+        prod = tuple(regex_matches[i] for i in s)
+        logger.debug("regex stack {}".format(prod))
+        prods.append(prod)
     return prods
+
+
+class _RegexLattice:
+    def __init__(self, txt: str, regex_matches: Sequence[RegexMatch]) -> None:
+        """The graph of consecutive regex matches, whose maximal paths are the
+        sequences returned by _regex_stack.
+
+        Two matches i < j are consecutive iff j starts at the end of i or
+        after it, separated by whitespace only. As the matches are sorted by
+        their start, the successors of i are the contiguous range of matches
+        starting between the end of i and the end of the whitespace run there.
+        The ranges are found by bisection and the whitespace runs are looked up
+        in a table computed once for the text, so neither an n x n matrix nor
+        a regex call per pair of matches is needed.
+
+        The number of paths can grow exponentially with the number of
+        overlapping matches, the graph itself is linear in the number of
+        matches and ranges.
+        """
+        self.regex_matches = regex_matches
+        n_rm = len(regex_matches)
+
+        # ws_end[p] is the end of the whitespace run starting at p (p if there
+        # is none)
+        ws_end = list(range(len(txt) + 1))
+        for m in _whitespace_regex.finditer(txt):
+            run_end = m.end()
+            for p in range(m.start(), run_end):
+                ws_end[p] = run_end
+
+        starts = [m.mstart for m in regex_matches]
+        # the successors of match i are range(*successors[i])
+        self.successors = []  # type: List[Tuple[int, int]]
+        # difference array of the number of predecessors of each match
+        n_pred = [0] * (n_rm + 1)
+        for i, m in enumerate(regex_matches):
+            lo = max(bisect_left(starts, m.mend), i + 1)
+            hi = max(bisect_right(starts, ws_end[m.mend]), lo)
+            self.successors.append((lo, hi))
+            n_pred[lo] += 1
+            n_pred[hi] -= 1
+        # NOTE(glanaro): I believe this means that this is a beginning node.
+        self.begins = []  # type: List[int]
+        n = 0
+        for i in range(n_rm):
+            n += n_pred[i]
+            if n == 0:
+                self.begins.append(i)
+
+        # the largest end of the last match of all paths from match i
+        self.reach_end = [0] * n_rm
+        for i in reversed(range(n_rm)):
+            lo, hi = self.successors[i]
+            self.reach_end[i] = (
+                max(self.reach_end[lo:hi]) if lo < hi else regex_matches[i].mend
+            )
+
+    def min_covered_chars(
+        self, relative_match_len: float, max_stack_depth: int
+    ) -> float:
+        """Return a number of characters such that no sequence covering fewer
+        is kept on the initial stack by _timenlp, given the search parameters.
+
+        Only sequences covering at least *relative_match_len* times the
+        characters of the longest sequence are kept and at most
+        *max_stack_depth* of them. There are at least *max_stack_depth*
+        sequences covering as many characters as the longest sequences of the
+        first *max_stack_depth* beginnings, whichever their scores.
+        """
+        covered = sorted(
+            (self.reach_end[b] - self.regex_matches[b].mstart for b in self.begins),
+            reverse=True,
+        )
+        if not covered:
+            return 0
+        bound = covered[0] * relative_match_len
+        if 0 < max_stack_depth <= len(covered):
+            bound = max(bound, covered[max_stack_depth - 1])
+        return bound
+
+    def stacks(
+        self,
+        min_covered_chars: float = 0,
+        on_do_iter: Callable[[], None] = lambda: None,
+    ) -> Iterator[Tuple[int, ...]]:
+        """Generate the indices of the matches of all maximal paths covering at
+        least *min_covered_chars* characters, in the order of _regex_stack.
+
+        Paths are only extended by matches from which such a path can still be
+        reached, so every step contributes to a path that is generated.
+        """
+        reach_end = self.reach_end
+        for b in self.begins:
+            mstart = self.regex_matches[b].mstart
+            if reach_end[b] - mstart < min_covered_chars:
+                continue
+            stack = [(b,)]  # type: List[Tuple[int, ...]]
+            while stack:
+                on_do_iter()
+                s = stack.pop()
+                lo, hi = self.successors[s[-1]]
+                if lo < hi:
+                    stack.extend(
+                        s + (j,)
+                        for j in range(lo, hi)
+                        if reach_end[j] - mstart >= min_covered_chars
+                    )
+                else:
+                    yield s
+
+    def longest_stacks(
+        self,
+        min_covered_chars: float = 0,
+        on_do_iter: Callable[[], None] = lambda: None,
+    ) -> Iterator[Tuple[int, ...]]:
+        """Generate the same paths as `stacks`, those covering the most
+        characters first and in the order of `stacks` among equal coverage.
+
+        The paths are extended best first, by the largest coverage still
+        reachable from them, hence taking the first k paths only builds
+        those that can be among the k longest.
+        """
+        reach_end = self.reach_end
+        heap = []  # type: List[Tuple[int, Tuple[int, ...], Tuple[int, ...]]]
+        for b in self.begins:
+            covered = reach_end[b] - self.regex_matches[b].mstart
+            if covered >= min_covered_chars:
+                heappush(heap, (-covered, self.order_key((b,)), (b,)))
+        while heap:
+            on_do_iter()
+            _, _, s = heappop(heap)
+            lo, hi = self.successors[s[-1]]
+            if lo == hi:
+                yield s
+                continue
+            mstart = self.regex_matches[s[0]].mstart
+            for j in range(lo, hi):
+                covered = reach_end[j] - mstart
+                if covered >= min_covered_chars:
+                    t = s + (j,)
+                    heappush(heap, (-covered, self.order_key(t), t))
+
+    @staticmethod
+    def order_key(s: Tuple[int, ...]) -> Tuple[int, ...]:
+        # stacks generates the paths by beginning and then depth first,
+        # taking the successor with the largest index first
+        return (s[0],) + tuple(-j for j in s[1:])
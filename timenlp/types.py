@@ -1,4 +1,5 @@
 from datetime import datetime
+from operator import attrgetter
 from typing import Any, Dict, Optional, Tuple, Type, TypeVar
 
 import regex
@@ -7,12 +8,62 @@ import enum
 
 T = TypeVar("T", bound="Artifact")
 
+_object_setattr = object.__setattr__
+
+# attributes derived from the others, reset whenever an attribute is set
+_derived_attrs = frozenset(("_hash", "_signature"))
+
 
 class Artifact:
+    # Artifacts are created by the thousands during a parse and used as
+    # dictionary keys, hence the slots and the cached hash. Subclasses declare
+    # their own __slots__ and the attributes that make up equality in _attrs,
+    # which must be set in the class body, see __init_subclass__.
+    __slots__ = ("mstart", "mend", "_hash", "_signature")
+
+    mstart: int
+    mend: int
+    _hash: Optional[int]
+    # (number of predicates tested, bits), see rule.signature
+    _signature: Optional[Tuple[int, int]]
+
+    _attrs = ("mstart", "mend")  # type: Tuple[str, ...]
+    _values = attrgetter(*_attrs)
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        # _values is derived from the _attrs of the class body
+        cls._values = attrgetter(*cls._attrs)
+
     def __init__(self) -> None:
-        self.mstart = 0
-        self.mend = 0
-        self._attrs = ["mstart", "mend"]
+        # __init__ methods set the slots with _object_setattr: nothing is
+        # cached yet and __setattr__ is comparatively slow
+        _object_setattr(self, "mstart", 0)
+        _object_setattr(self, "mend", 0)
+        _object_setattr(self, "_hash", None)
+        _object_setattr(self, "_signature", None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        _object_setattr(self, name, value)
+        if name not in _derived_attrs:
+            _object_setattr(self, "_hash", None)
+            _object_setattr(self, "_signature", None)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # hashes of strings differ between processes, do not pickle them
+        state = {
+            a: getattr(self, a)
+            for cls in type(self).__mro__
+            for a in getattr(cls, "__slots__", ())
+            if a not in _derived_attrs and hasattr(self, a)
+        }
+        # subclasses without __slots__
+        state.update(getattr(self, "__dict__", {}))
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for a, value in state.items():
+            setattr(self, a, value)
 
     def update_span(self: T, *args: "Artifact") -> T:
         self.mstart = args[0].mstart
@@ -41,10 +92,14 @@ class Artifact:
         if type(other) != type(self):
             return False
         else:
-            return all(getattr(self, a) == getattr(other, a) for a in self._attrs)
+            return self is other or self._values(self) == other._values(other)
 
     def __hash__(self) -> int:
-        return hash(tuple(getattr(self, a) for a in self._attrs))
+        h = self._hash
+        if h is None:
+            h = hash(self._values(self))
+            _object_setattr(self, "_hash", h)
+        return h
 
     def _hasOnly(self, *args: str) -> bool:
         """check that all attributes set to True are set (i.e. not None) and
@@ -73,15 +128,26 @@ class Artifact:
         
 
 class RegexMatch(Artifact):
+    __slots__ = ("id", "key", "match", "_text")
+
+    id: int
+    key: str
+    match: Regex
+    _text: str
+
+    _attrs: Tuple[str, ...] = ("mstart", "mend", "id")
+
     def __init__(self, id: int, m: Regex) -> None:
         super().__init__()
-        self._attrs = ["mstart", "mend", "id"]
-        self.key = "R{}".format(id)
-        self.id = id
-        self.match = m
-        self.mstart = m.span(self.key)[0]
-        self.mend = m.span(self.key)[1]
-        self._text = m.group(self.key)
+        init = _object_setattr
+        key = "R{}".format(id)
+        init(self, "key", key)
+        init(self, "id", id)
+        init(self, "match", m)
+        mstart, mend = m.span(key)
+        init(self, "mstart", mstart)
+        init(self, "mend", mend)
+        init(self, "_text", m.group(key))
 
     def __str__(self) -> str:
         return "{}:{}".format(self.id, self._text)
@@ -270,8 +336,47 @@ _TIME_REGEX = regex.compile(
     r"(\d{4}|X)-(\d{2}|X)-(\d{2}|X) (\d{2}|X):(\d{2}|X) \((\d|X)\/(\w+)\)"
 )
 
+# bits of the fields of a Time in Time._mask
+_YEAR, _MONTH, _DAY, _HOUR, _MINUTE, _DOW, _POD = (1 << i for i in range(7))
+_DATE = _YEAR | _MONTH | _DAY
+_field_bits = {
+    "year": _YEAR,
+    "month": _MONTH,
+    "day": _DAY,
+    "hour": _HOUR,
+    "minute": _MINUTE,
+    "DOW": _DOW,
+    "POD": _POD,
+}
+
 
 class Time(Artifact):
+    __slots__ = (
+        "year",
+        "month",
+        "day",
+        "hour",
+        "minute",
+        "DOW",
+        "POD",
+        "meridiemLatent",
+        "tag",
+        "_mask",
+    )
+
+    year: Optional[int]
+    month: Optional[int]
+    day: Optional[int]
+    hour: Optional[int]
+    minute: Optional[int]
+    DOW: Optional[int]
+    POD: Optional[str]
+    meridiemLatent: Optional[bool]
+    tag: Optional[Dict[Any, Any]]
+    _mask: int
+
+    _attrs: Tuple[str, ...] = ("year", "month", "day", "hour", "minute", "DOW", "POD")
+
     def __init__(
         self,
         year: Optional[int] = None,
@@ -285,17 +390,39 @@ class Time(Artifact):
         tag: Optional[dict] = None
     ) -> None:
         super().__init__()
-        self._attrs = ["year", "month", "day", "hour", "minute", "DOW", "POD"]
         # Might add some validation here, did not to avoid the overhead
-        self.year = year
-        self.month = month
-        self.day = day
-        self.hour = hour
-        self.minute = minute
-        self.DOW = DOW
-        self.POD = POD
-        self.meridiemLatent = meridiemLatent
-        self.tag = tag
+        init = _object_setattr
+        init(self, "year", year)
+        init(self, "month", month)
+        init(self, "day", day)
+        init(self, "hour", hour)
+        init(self, "minute", minute)
+        init(self, "DOW", DOW)
+        init(self, "POD", POD)
+        init(self, "meridiemLatent", meridiemLatent)
+        init(self, "tag", tag)
+        # the fields that are set, so the properties below need to compare
+        # just one integer
+        init(
+            self,
+            "_mask",
+            (_YEAR if year is not None else 0)
+            | (_MONTH if month is not None else 0)
+            | (_DAY if day is not None else 0)
+            | (_HOUR if hour is not None else 0)
+            | (_MINUTE if minute is not None else 0)
+            | (_DOW if DOW is not None else 0)
+            | (_POD if POD is not None else 0),
+        )
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        bit = _field_bits.get(name)
+        if bit is not None:
+            # _mask is not set yet while unpickling
+            mask = getattr(self, "_mask", 0)
+            mask = mask & ~bit if value is None else mask | bit
+            _object_setattr(self, "_mask", mask)
 
     # -----------------------------------------------------------------------------
     # Make sure to not accidentially test bool(x) as False when x==0, but you meant
@@ -305,13 +432,13 @@ class Time(Artifact):
     def isDOY(self) -> bool:
         """isDayOfYear <=> a dd.mm but not year
         """
-        return self._hasOnly("month", "day")
+        return self._mask == _MONTH | _DAY
 
     @property
     def isDOM(self) -> bool:
         """isDayOfMonth <=> a dd but no month
         """
-        return self._hasOnly("day")
+        return self._mask == _DAY
 
     @property
     def isDOW(self) -> bool:
@@ -320,78 +447,78 @@ class Time(Artifact):
         however, the production rules do not do that.
 
         """
-        return self._hasOnly("DOW")
+        return self._mask == _DOW
 
     @property
     def isMonth(self) -> bool:
-        return self._hasOnly("month")
+        return self._mask == _MONTH
 
     @property
     def isYearAndMonth(self) -> bool:
-        return self._hasOnly("year", "month")
+        return self._mask == _YEAR | _MONTH
 
     @property
     def isPOD(self) -> bool:
         """isPartOfDay <=> morning, etc.; fragile, tests only that there is a
         POD and neither a full date nor a full time
         """
-        return self._hasOnly("POD")
+        return self._mask == _POD
 
     @property
     def isHour(self) -> bool:
         """only has an hour"""
-        return self._hasOnly("hour")
+        return self._mask == _HOUR
 
     @property
     def isTOD(self) -> bool:
         """isTimeOfDay - only a time, not date"""
-        return self._hasOnly("hour") or self._hasOnly("hour", "minute")
+        return self._mask == _HOUR or self._mask == _HOUR | _MINUTE
 
     @property
     def isDate(self) -> bool:
         """isDate - only a date, not time"""
-        return self._hasOnly("year", "month", "day")
+        return self._mask == _DATE
 
     @property
     def isDateTime(self) -> bool:
         """a date and a time"""
-        return self._hasOnly("year", "month", "day", "hour") or self._hasOnly(
-            "year", "month", "day", "hour", "minute"
+        return (
+            self._mask == _DATE | _HOUR or self._mask == _DATE | _HOUR | _MINUTE
         )
 
     @property
     def isDateWithPOD(self) -> bool:
-        return self._hasOnly("year", "month", "day", "POD")
+        return self._mask == _DATE | _POD
 
     @property
     def isYear(self) -> bool:
         """just a year"""
-        return self._hasOnly("year")
+        return self._mask == _YEAR
 
     @property
     def hasDate(self) -> bool:
         """at least a date"""
-        return self._hasAtLeast("year", "month", "day")
+        return self._mask & _DATE == _DATE
 
     @property
     def hasDOY(self) -> bool:
         """at least a day of year"""
-        return self._hasAtLeast("month", "day")
+        return self._mask & (_MONTH | _DAY) == _MONTH | _DAY
 
     @property
     def hasDOW(self) -> bool:
         """at least a day of week"""
-        return self._hasAtLeast("DOW")
+        return self._mask & _DOW != 0
 
     @property
     def hasTime(self) -> bool:
         """at least a time to the hour"""
-        return self._hasAtLeast("hour")
+        return self._mask & _HOUR != 0
 
     @property
     def hasPOD(self) -> bool:
         """at least a part of day"""
-        return self._hasAtLeast("POD")
+        return self._mask & _POD != 0
 
     @property
     def isMeridiemLatent(self) -> bool:
@@ -438,17 +565,18 @@ class Time(Artifact):
                 POD=None if pod == "X" else pod,
             )
 
+    def _start_hour(self) -> int:
+        if self.hour is None and self.POD is not None:
+            return pod_hours[self.POD][0]
+        return self.hour or 0
+
     @property
     def start(self) -> "Time":
-        if self.hour is None and self.hasPOD:
-            hour = pod_hours[self.POD][0]  # type: ignore
-        else:
-            hour = self.hour or 0
         return Time(
             year=self.year,
             month=self.month,
             day=self.day,
-            hour=hour,
+            hour=self._start_hour(),
             minute=self.minute or 0,
         )
 
@@ -469,23 +597,30 @@ class Time(Artifact):
     @property
     def dt(self) -> datetime:
         # Use the start time, in case we have a POD specification
-        t = self.start
-        if t.year is None or t.month is None or t.day is None:
+        if self.year is None or self.month is None or self.day is None:
             raise ValueError(
                 "cannot convert underspecified Time into datetime"
                 ", missing at least one of year, month or day"
             )
-        return datetime(t.year, t.month, t.day, t.hour or 0, t.minute or 0)
+        return datetime(
+            self.year, self.month, self.day, self._start_hour(), self.minute or 0
+        )
 
 
 class Interval(Artifact):
+    __slots__ = ("t_from", "t_to")
+
+    t_from: Optional[Time]
+    t_to: Optional[Time]
+
+    _attrs: Tuple[str, ...] = ("t_from", "t_to")
+
     def __init__(
         self, t_from: Optional[Time] = None, t_to: Optional[Time] = None
     ) -> None:
         super().__init__()
-        self._attrs = ["t_from", "t_to"]
-        self.t_from = t_from
-        self.t_to = t_to
+        _object_setattr(self, "t_from", t_from)
+        _object_setattr(self, "t_to", t_to)
 
     @property
     def isTimeInterval(self) -> bool:
@@ -537,6 +672,12 @@ class DurationUnit(enum.Enum):
 
 
 class Duration(Artifact):
+    __slots__ = ("value", "unit", "tag")
+
+    value: int
+    unit: DurationUnit
+    tag: Optional[Dict[Any, Any]]
+
     def __init__(self, value: int, unit: DurationUnit, tag: Optional[dict] = None):
         """Create a Duration using value and unit.
 
@@ -545,9 +686,9 @@ class Duration(Artifact):
         minute, hour, day, night, week, month, year
         """
         super().__init__()
-        self.value = value
-        self.unit = unit
-        self.tag = tag
+        _object_setattr(self, "value", value)
+        _object_setattr(self, "unit", unit)
+        _object_setattr(self, "tag", tag)
 
     def __str__(self) -> str:
         return "{} {}".format(self.value, self.unit.value)